@@ -0,0 +1,368 @@
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from build_clean import read_manifest
+from ingest import LOG_TABLE
+from queries import (
+    RESULTS_TABLE_COLUMNS,
+    filter_pml,
+    results_plan,
+    score_summary,
+    song_detail,
+)
+from sql_store import SQLDataset
+from storage import DB_PATH, POOL_SIZE, ReadOnlyPool
+from warmup import Warmup
+
+HOST = "127.0.0.1"
+PORT = 8502
+PAGE_SIZE = 200
+MAX_PAGE_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class NotReady(RuntimeError):
+    pass
+
+
+def _records(df):
+    # pandas writes NaN/NA as null and numpy scalars as plain numbers
+    return json.loads(df.to_json(orient="records"))
+
+
+def _series(series):
+    return {str(key): value for key, value in json.loads(series.to_json()).items()}
+
+
+def _summary(summary):
+    return {
+        score: {name: _series(values) for name, values in parts.items()}
+        for score, parts in summary.items()
+    }
+
+
+def _one(params, name, default=None, kind=str):
+    values = params.get(name)
+    if not values or values[-1] == "":
+        return default
+    try:
+        return kind(values[-1])
+    except ValueError:
+        raise BadRequest(f"{name} must be {kind.__name__}, got {values[-1]!r}")
+
+
+def _page(params):
+    page = _one(params, "page", 1, int)
+    page_size = _one(params, "page_size", PAGE_SIZE, int)
+    if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise BadRequest(f"page must be >= 1, page_size 1-{MAX_PAGE_SIZE}")
+
+    return page, page_size
+
+
+def _paged(page, page_size, n_rows, df):
+    return {
+        "page": page,
+        "page_size": page_size,
+        "rows": n_rows,
+        "data": _records(df),
+    }
+
+
+def _years(params):
+    low = _one(params, "year_from", kind=int)
+    high = _one(params, "year_to", kind=int)
+    if low is None and high is None:
+        return None
+    return (low if low is not None else 0, high if high is not None else 9999)
+
+
+def _results_filters(params):
+    event = _one(params, "event")
+    if event is None:
+        raise BadRequest("event is required")
+
+    return {
+        "event": event,
+        "sub_events": params.get("sub_event", []),
+        "school": _one(params, "school", ""),
+        "school_level": _one(params, "school_level"),
+        "conferences": params.get("conference", []),
+        "classification": _one(params, "classification"),
+        "years": _years(params),
+        "song": _one(params, "song", ""),
+        "composer": _one(params, "composer", ""),
+    }
+
+
+def _pml_filters(params):
+    grade_min = _one(params, "grade_min", kind=int)
+    grade_max = _one(params, "grade_max", kind=int)
+    grades = None
+    if grade_min is not None or grade_max is not None:
+        grades = (grade_min or 0, grade_max if grade_max is not None else 6)
+
+    return {
+        "query": _one(params, "q", ""),
+        "grades": grades,
+        "event": _one(params, "event"),
+        "accompaniment": _one(params, "accompaniment", "Both"),
+        "min_performance_count": _one(params, "min_performance_count", 0, int),
+    }
+
+
+def results(data, params):
+    plan = results_plan(data, **_results_filters(params))
+    positions = data.filter_cache.get(("positions", plan.key()), plan.positions)
+    page, page_size = _page(params)
+    start = (page - 1) * page_size
+
+    return _paged(
+        page,
+        page_size,
+        len(positions),
+        plan.execute(
+            positions=positions[start : start + page_size],
+            columns=RESULTS_TABLE_COLUMNS,
+        ),
+    )
+
+
+def summary(data, params):
+    filters = _results_filters(params)
+    plan = results_plan(data, **filters)
+    text = [filters.pop(name) for name in ["school", "song", "composer"]]
+    selected, overall = score_summary(
+        data, plan, filters.pop("event"), text_search=any(text), **filters
+    )
+
+    return {"selected": _summary(selected), "overall": _summary(overall)}
+
+
+def pml(data, params):
+    pml_df = filter_pml(data, **_pml_filters(params))
+    page, page_size = _page(params)
+    start = (page - 1) * page_size
+
+    return _paged(page, page_size, len(pml_df), pml_df.iloc[start : start + page_size])
+
+
+def history(data, params, code):
+    detail = song_detail(data, code, _one(params, "event"))
+    performances = data.results_df.loc[detail["song_ids"]]
+    by_year = performances.groupby("year")
+
+    return {
+        "code": code,
+        "title": detail["title"],
+        "composer": detail["composer"],
+        "event": detail["event"],
+        "grade": detail["grade"],
+        "earliest_year": detail["earliest_year"],
+        "performances": len(performances),
+        "category_performances": len(detail["category_ids"]),
+        "by_year": {
+            "count": _series(by_year.size()),
+            "concert_final_score": _series(by_year["concert_final_score"].mean()),
+        },
+    }
+
+
+def sql_results(data, params):
+    filters = _results_filters(params)
+    page, page_size = _page(params)
+    n_rows, df = data.results(offset=(page - 1) * page_size, limit=page_size, **filters)
+
+    return _paged(page, page_size, n_rows, df)
+
+
+def sql_summary(data, params):
+    selected, overall = data.summary(**_results_filters(params))
+    return {"selected": _summary(selected), "overall": _summary(overall)}
+
+
+def sql_pml(data, params):
+    page, page_size = _page(params)
+    n_rows, df = data.pml(
+        offset=(page - 1) * page_size, limit=page_size, **_pml_filters(params)
+    )
+
+    return _paged(page, page_size, n_rows, df)
+
+
+def sql_history(data, params, code):
+    detail = data.history(code, _one(params, "event"))
+    by_year = detail.pop("by_year")
+
+    return {
+        **detail,
+        "by_year": {column: _series(by_year[column]) for column in by_year.columns},
+    }
+
+
+QUERIES = {"results": results, "summary": summary, "pml": pml, "history": history}
+# --sql: the same endpoints answered by uil_clean.db, see sql_store.py
+SQL_QUERIES = {
+    "results": sql_results,
+    "summary": sql_summary,
+    "pml": sql_pml,
+    "history": sql_history,
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    # server.warmup, server.queries and server.pool are set by make_server
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query, keep_blank_values=True)
+        parts = [urllib.parse.unquote(part) for part in url.path.split("/") if part]
+
+        try:
+            status, body = 200, self.route(parts, params)
+        except BadRequest as exc:
+            status, body = 400, {"error": str(exc)}
+        except KeyError as exc:
+            status, body = 404, {"error": f"not found: {exc.args[0]}"}
+        except NotReady as exc:
+            status, body = 503, {"error": str(exc)}
+        except Exception:
+            logger.exception("GET %s failed", self.path)
+            status, body = 500, {"error": "internal error"}
+
+        self.send_json(status, body)
+
+    def route(self, parts, params):
+        warmup = self.server.warmup
+        if parts == ["health"]:
+            snapshot = warmup.snapshot
+            return {
+                **warmup.status(),
+                "version": None if snapshot is None else snapshot.name,
+            }
+        if parts == ["versions"]:
+            return self.versions()
+
+        data = warmup.snapshot
+        if data is None:
+            raise NotReady("the data is still loading")
+
+        queries = self.server.queries
+        if parts in (["results"], ["summary"], ["pml"]):
+            return queries[parts[0]](data, params)
+        if len(parts) == 3 and parts[0] == "pml" and parts[2] == "history":
+            return queries["history"](data, params, parts[1])
+        if len(parts) == 3 and parts[0] == "pml" and parts[2] == "raw":
+            return self.raw_pml(parts[1])
+
+        raise KeyError(self.path)
+
+    def raw_pml(self, code):
+        # every uil.db column of the title, not only the ones the app keeps
+        rows = self.server.pool.query('SELECT * FROM "pml" WHERE "code" = ?', (code,))
+        if not rows:
+            raise KeyError(code)
+        return {"code": code, "rows": rows}
+
+    def versions(self):
+        snapshot = self.server.warmup.snapshot
+        try:
+            ingested = self.server.pool.query(
+                f'SELECT * FROM "{LOG_TABLE}" ORDER BY version'
+            )
+        except sqlite3.OperationalError:
+            # nothing has been ingested into this database yet
+            ingested = []
+
+        return {
+            "loaded": (
+                None
+                if snapshot is None
+                else {
+                    "name": snapshot.name,
+                    "build_id": snapshot.build_id,
+                    "deltas": snapshot.deltas,
+                }
+            ),
+            "manifest": read_manifest(self.server.warmup.dataset.out_dir),
+            "ingested": ingested,
+        }
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug("%s " + format, self.address_string(), *args)
+
+
+def make_server(
+    host=HOST,
+    port=PORT,
+    db_path=DB_PATH,
+    warmup=None,
+    pool_size=POOL_SIZE,
+    sql=False,
+):
+    # in SQL mode the process never loads the frames, every query is pushed
+    # down to the indexed copy of the cleaned tables
+    if warmup is None:
+        warmup = Warmup(SQLDataset(pool_size=pool_size) if sql else None)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.warmup = warmup.start()
+    server.queries = SQL_QUERIES if sql else QUERIES
+    server.pool = ReadOnlyPool(db_path, pool_size)
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve the dashboard's queries as JSON without Streamlit."
+    )
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--db", default=DB_PATH, help="database for raw lookups")
+    parser.add_argument(
+        "--pool-size", type=int, default=POOL_SIZE, help="read-only connections"
+    )
+    parser.add_argument(
+        "--sql",
+        action="store_true",
+        help="answer queries from the indexed SQLite copy instead of memory",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    server = make_server(
+        args.host, args.port, args.db, pool_size=args.pool_size, sql=args.sql
+    )
+    logger.info("serving on http://%s:%s", *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.warmup.stop()
+        server.pool.close()
+        server.server_close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,401 @@
+import argparse
+import base64
+import concurrent.futures
+import datetime
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import statistics
+import sys
+import threading
+import time
+
+import bcrypt
+import extra_streamlit_components as stx
+import streamlit as st
+import yaml
+from cachetools import LRUCache
+
+CONFIG_PATH = "config.yaml"
+# bcrypt work factor for new hashes, each step doubles the cost of a login
+BCRYPT_ROUNDS = int(os.environ.get("UIL_BCRYPT_ROUNDS") or 12)
+# verified session tokens remembered per process
+MAX_SESSIONS = 4096
+
+logger = logging.getLogger(__name__)
+
+
+def _is_hash(password):
+    return password.startswith(("$2a$", "$2b$", "$2y$"))
+
+
+def hash_password(password, rounds=BCRYPT_ROUNDS):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def read_config(path=CONFIG_PATH):
+    with open(path) as file:
+        return yaml.safe_load(file)
+
+
+def validate_config(config):
+    # fail at startup on a broken config.yaml rather than on someone's login
+    if not isinstance(config, dict):
+        raise ValueError("config must be a mapping")
+
+    cookie = config.get("cookie") or {}
+    for key in ["name", "key", "expiry_days"]:
+        if key not in cookie:
+            raise ValueError(f"cookie.{key} is missing")
+    if (
+        not isinstance(cookie["expiry_days"], (int, float))
+        or cookie["expiry_days"] <= 0
+    ):
+        raise ValueError("cookie.expiry_days must be a positive number")
+
+    users = (config.get("credentials") or {}).get("usernames") or {}
+    if not users:
+        raise ValueError("credentials.usernames is empty")
+    for username, user in users.items():
+        if not isinstance(user, dict):
+            raise ValueError(f"credentials for {username!r} must be a mapping")
+        for key in ["name", "password"]:
+            if not user.get(key):
+                raise ValueError(f"{username!r} has no {key}")
+
+    return config
+
+
+class Credentials:
+    # bcrypt hashes of every user; plaintext passwords left in config.yaml
+    # are hashed on the user's first login, hashing them all at load put
+    # ~0.3s per user on every cold start
+    def __init__(self, users, rounds=BCRYPT_ROUNDS):
+        self.rounds = rounds
+        self.users = {}
+        self._plaintext = {}
+        for username, user in users.items():
+            password = str(user["password"])
+            key = str(username).lower()
+            if not _is_hash(password):
+                self._plaintext[key] = password
+            self.users[key] = {
+                "username": str(username),
+                "name": user["name"],
+                "email": user.get("email"),
+                "hash": password.encode() if _is_hash(password) else None,
+            }
+
+        if self._plaintext:
+            logger.warning(
+                "%d plaintext passwords in the config, store hashes with "
+                "`python auth.py hash`",
+                len(self._plaintext),
+            )
+
+        # every check costs exactly one bcrypt run of this cost: unknown
+        # users hash the attempt with this salt and the result is thrown away
+        self._salt = bcrypt.gensalt(rounds)
+        self._lock = threading.Lock()
+
+    def verify(self, username, password):
+        key = str(username).strip().lower()
+        password = str(password).encode()
+        user = self.users.get(key)
+
+        if user is None:
+            bcrypt.hashpw(password, self._salt)
+            return None
+
+        with self._lock:
+            hashed = user["hash"]
+            plaintext = self._plaintext.get(key)
+        if hashed is not None:
+            ok = bcrypt.checkpw(password, hashed)
+        else:
+            # a plaintext user's first login hashes the password in place of
+            # the check, outside the lock; the first finished hash is kept
+            hashed = hash_password(plaintext, self.rounds).encode()
+            with self._lock:
+                if user["hash"] is None:
+                    user["hash"] = hashed
+                    self._plaintext.pop(key, None)
+            ok = hmac.compare_digest(
+                hashlib.sha256(password).digest(),
+                hashlib.sha256(plaintext.encode()).digest(),
+            )
+
+        return user if ok else None
+
+
+class SessionSigner:
+    # stateless session tokens: the username and expiry signed with the
+    # cookie key, so any process with the same config can check them
+    def __init__(self, key, max_age):
+        self._key = hashlib.sha256(str(key).encode()).digest()
+        self.max_age = max_age
+
+    def _sign(self, payload):
+        digest = hmac.new(self._key, payload.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+    def issue(self, username, now=None):
+        expires = int((now or time.time()) + self.max_age)
+        name = base64.urlsafe_b64encode(username.encode()).decode().rstrip("=")
+        payload = f"{name}.{expires}.{secrets.token_urlsafe(12)}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token, now=None):
+        # the username and expiry of a genuine, unexpired token, else None
+        try:
+            name, expires, nonce, signature = str(token).split(".")
+            expires = int(expires)
+            username = base64.urlsafe_b64decode(name + "=" * (-len(name) % 4))
+            username = username.decode()
+        except ValueError:
+            return None
+
+        # bytes, a tampered cookie may hold characters compare_digest rejects
+        payload = f"{name}.{expires}.{nonce}"
+        if not hmac.compare_digest(signature.encode(), self._sign(payload).encode()):
+            return None
+        if expires <= (now or time.time()):
+            return None
+
+        return username, expires
+
+
+class Auth:
+    # one per process: the parsed config, the hashes and the sessions that
+    # have already been verified
+    def __init__(self, config, rounds=BCRYPT_ROUNDS, max_sessions=MAX_SESSIONS):
+        validate_config(config)
+        cookie = config["cookie"]
+        self.cookie_name = cookie["name"]
+        self.expiry_days = cookie["expiry_days"]
+        self.credentials = Credentials(config["credentials"]["usernames"], rounds)
+        self.signer = SessionSigner(cookie["key"], self.expiry_days * 86400)
+        self._sessions = LRUCache(maxsize=max_sessions)
+        self._revoked = LRUCache(maxsize=max_sessions)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path=CONFIG_PATH, rounds=BCRYPT_ROUNDS):
+        return cls(read_config(path), rounds)
+
+    def login(self, username, password):
+        # the full bcrypt check, a session token on success
+        user = self.credentials.verify(username, password)
+        if user is None:
+            return None
+
+        token = self.signer.issue(user["username"])
+        with self._lock:
+            self._sessions[token] = (user, time.time() + self.signer.max_age)
+
+        return token
+
+    def session(self, token):
+        # the user behind a token, reruns hit the cache and skip the hmac too
+        if not token:
+            return None
+
+        now = time.time()
+        with self._lock:
+            cached = self._sessions.get(token)
+            if token in self._revoked:
+                return None
+        if cached is not None:
+            user, expires = cached
+            return user if expires > now else None
+
+        verified = self.signer.verify(token, now)
+        if verified is None:
+            return None
+        username, expires = verified
+        user = self.credentials.users.get(username.lower())
+        if user is None:
+            return None
+
+        with self._lock:
+            self._sessions[token] = (user, expires)
+
+        return user
+
+    def logout(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+            self._revoked[token] = True
+
+
+class StreamlitLogin:
+    # login form and cookie handling with the streamlit-authenticator call
+    # shape main.py was written against
+    def __init__(self, auth, cookie_key="uil_auth_cookies"):
+        self.auth = auth
+        self.cookies = stx.CookieManager(key=cookie_key)
+
+    def _set_state(self, user, token):
+        state = st.session_state
+        state["auth_token"] = token
+        state["authentication_status"] = user is not None
+        state["name"] = None if user is None else user["name"]
+        state["username"] = None if user is None else user["username"]
+
+    def login(self, form_name="Login", location="main"):
+        state = st.session_state
+        token = state.get("auth_token") or self.cookies.get(self.auth.cookie_name)
+        user = self.auth.session(token)
+
+        if user is not None:
+            self._set_state(user, token)
+        else:
+            container = st.sidebar if location == "sidebar" else st
+            with container.form(form_name):
+                st.subheader(form_name)
+                username = st.text_input("Username")
+                password = st.text_input("Password", type="password")
+                submitted = st.form_submit_button(form_name)
+
+            if submitted:
+                token = self.auth.login(username, password)
+                user = self.auth.session(token)
+                self._set_state(user, token)
+                if token is not None:
+                    self.cookies.set(
+                        self.auth.cookie_name,
+                        token,
+                        expires_at=datetime.datetime.now()
+                        + datetime.timedelta(days=self.auth.expiry_days),
+                        key="set_auth_cookie",
+                    )
+            elif state.get("authentication_status") is not False:
+                state["authentication_status"] = None
+
+        return (
+            state.get("name"),
+            state.get("authentication_status"),
+            state.get("username"),
+        )
+
+    def logout(self, button_name="Logout", location="main"):
+        container = st.sidebar if location == "sidebar" else st
+        if container.button(button_name):
+            self.auth.logout(st.session_state.get("auth_token"))
+            self._set_state(None, None)
+            st.session_state["authentication_status"] = None
+            if self.cookies.get(self.auth.cookie_name) is not None:
+                self.cookies.delete(self.auth.cookie_name, key="delete_auth_cookie")
+
+
+def hash_config(path=CONFIG_PATH, rounds=BCRYPT_ROUNDS):
+    # replace the plaintext passwords in config.yaml with bcrypt hashes
+    config = validate_config(read_config(path))
+    hashed = 0
+    for user in config["credentials"]["usernames"].values():
+        if not _is_hash(str(user["password"])):
+            user["password"] = hash_password(str(user["password"]), rounds)
+            hashed += 1
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        yaml.safe_dump(config, file, sort_keys=False)
+    os.replace(tmp_path, path)
+
+    return hashed
+
+
+def login_benchmark(users=50, logins=200, threads=8, rounds=BCRYPT_ROUNDS):
+    # a burst of logins against a synthetic config, then the reruns that
+    # follow them, compared with re-parsing the config on every rerun
+    config = {
+        "cookie": {"name": "bench", "key": secrets.token_hex(16), "expiry_days": 1},
+        "credentials": {
+            "usernames": {
+                f"director{i}": {
+                    "name": f"Director {i}",
+                    "password": hash_password(f"password{i}", rounds),
+                }
+                for i in range(users)
+            }
+        },
+    }
+    auth = Auth(config, rounds)
+
+    def timed(func, n):
+        latencies = []
+
+        def one(i):
+            start = time.perf_counter()
+            result = func(i)
+            latencies.append(time.perf_counter() - start)
+            return result
+
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(one, range(n)))
+        seconds = time.perf_counter() - start
+
+        latencies.sort()
+        return results, {
+            "per_second": round(n / seconds, 1),
+            "median_ms": round(statistics.median(latencies) * 1000, 3),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 3),
+        }
+
+    tokens, password_logins = timed(
+        lambda i: auth.login(f"director{i % users}", f"password{i % users}"), logins
+    )
+    if not all(tokens):
+        raise RuntimeError("a benchmark login failed")
+
+    config_text = yaml.safe_dump(config)
+    reruns = logins * 10
+    _, cached_reruns = timed(lambda i: auth.session(tokens[i % logins]), reruns)
+    _, parsed_reruns = timed(lambda i: yaml.safe_load(config_text), reruns)
+
+    return {
+        "rounds": rounds,
+        "users": users,
+        "threads": threads,
+        "password_logins": password_logins,
+        "session_reruns": cached_reruns,
+        "yaml_reruns": parsed_reruns,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage and benchmark the logins.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    hash_parser = commands.add_parser("hash", help="hash plaintext passwords")
+    hash_parser.add_argument("--config", default=CONFIG_PATH)
+    hash_parser.add_argument("--rounds", type=int, default=BCRYPT_ROUNDS)
+
+    bench_parser = commands.add_parser("bench", help="login throughput")
+    bench_parser.add_argument("--users", type=int, default=50)
+    bench_parser.add_argument("--logins", type=int, default=200)
+    bench_parser.add_argument("--threads", type=int, default=8)
+    bench_parser.add_argument("--rounds", type=int, nargs="+", default=[BCRYPT_ROUNDS])
+    args = parser.parse_args(argv)
+
+    if args.command == "hash":
+        hashed = hash_config(args.config, args.rounds)
+        print(f"hashed {hashed} passwords in {args.config}")
+        return 0
+
+    for rounds in args.rounds:
+        report = login_benchmark(args.users, args.logins, args.threads, rounds)
+        for name in ["password_logins", "session_reruns", "yaml_reruns"]:
+            timing = report[name]
+            print(
+                f"rounds {rounds:>2}  {name:<16} {timing['per_second']:>10}/s  "
+                f"median {timing['median_ms']}ms  p95 {timing['p95_ms']}ms"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from build_clean import build, collect_dbs, load_clean
+from cleaning import clean_pml, clean_results, get_db
+from filters import FilterPlan
+from performance_index import PerformanceIndex
+from rollups import baseline, build_rollup, select, yearly_mean
+from search_index import build_search_indexes
+from storage import SQLiteStore
+
+# roughly the size of the real tables, --scale multiplies these
+BASE_ROWS = {"results": 40000, "pml": 8000}
+REPEAT = 5
+# chunk size of the streaming build stage
+CHUNK_ROWS = 10000
+# slowdown over the baseline reported as a regression
+TOLERANCE = 0.25
+
+EVENTS = [
+    ("band", "Band", "band"),
+    ("mixed chorus", "Chorus", "mixedchorus"),
+    ("tenor/bass chorus", "Chorus", "tenorbasschorus"),
+    ("treble chorus", "Chorus", "treblechorus"),
+    ("full orchestra", "Orchestra", "fullorchestra"),
+    ("string orchestra", "Orchestra", "stringorchestra"),
+]
+WORDS = ["Suite", "March", "Overture", "Ave Maria", "Fantasia", "Song", "Dance"]
+CONFERENCES = ["1A", "2A", "3A", "4A", "5A", "6A", "1C", "2C", "3C"]
+CLASSIFICATIONS = ["varsity", "non-varsity", "nv", "sub non-varsity", "v"]
+
+
+def generate_db(path, scale=1, seed=0):
+    # synthetic results/pml tables shaped like uil.db, including its mixed
+    # date formats, text scores and missing values
+    rng = np.random.default_rng(seed)
+    n_pml = int(BASE_ROWS["pml"] * scale)
+    n_results = int(BASE_ROWS["results"] * scale)
+
+    pml_event = rng.integers(len(EVENTS), size=n_pml)
+    pml_df = pd.DataFrame(
+        {
+            "event_name": [EVENTS[i][2] for i in pml_event],
+            "code": [f"{i:06d}" for i in range(n_pml)],
+            "grade": rng.choice(["1", "2", "3", "4", "5", "Grade 3"], n_pml),
+            "title": [
+                f"{WORDS[i % len(WORDS)]} No. {i}" for i in rng.permutation(n_pml)
+            ],
+            "composer": [f"Composer {i}" for i in rng.integers(n_pml // 8, size=n_pml)],
+            "arranger": rng.choice([None, "arr. Smith", "arr. Jones"], n_pml),
+            "specification": rng.choice([None, "(a cappella)", "(accomp)"], n_pml),
+            "performance_count": rng.integers(0, 200, n_pml),
+            "average_concert_score": rng.uniform(1, 3, n_pml),
+            "average_sight_reading_score": rng.uniform(1, 3, n_pml),
+            "song_score": rng.uniform(0, 5, n_pml),
+            "earliest_year": rng.integers(2005, 2020, n_pml),
+        }
+    )
+
+    codes_by_event = [np.flatnonzero(pml_event == i) for i in range(len(EVENTS))]
+    event = rng.integers(len(EVENTS), size=n_results)
+    year = rng.integers(2005, 2025, n_results)
+    day = rng.integers(10, 28, n_results)
+    date_kind = rng.integers(0, 20, n_results)
+    results = {
+        "contest_date": np.where(
+            date_kind == 0,
+            None,
+            np.where(
+                date_kind < 10,
+                [f"{y}-04-{d} 00:00" for y, d in zip(year, day)],
+                [f"{y}-03-{d}" for y, d in zip(year, day)],
+            ),
+        ),
+        "event": [EVENTS[i][0] for i in event],
+        "gen_event": [EVENTS[i][1] for i in event],
+        "school": [
+            f"School {i} HS" for i in rng.integers(n_results // 20, size=n_results)
+        ],
+        "director": [
+            f"Director {i}" for i in rng.integers(n_results // 10, size=n_results)
+        ],
+        "additional_director": None,
+        "conference": rng.choice(CONFERENCES, n_results),
+        "classification": rng.choice(CLASSIFICATIONS, n_results),
+    }
+    for slot in (1, 2, 3):
+        picks = np.empty(n_results, dtype=np.int64)
+        for i, codes in enumerate(codes_by_event):
+            rows = event == i
+            picks[rows] = rng.choice(codes, rows.sum())
+        results[f"title_{slot}"] = pml_df["title"].to_numpy()[picks]
+        results[f"composer_{slot}"] = pml_df["composer"].to_numpy()[picks]
+        results[f"code_{slot}"] = pml_df["code"].to_numpy()[picks]
+        results[f"concert_score_{slot}"] = rng.integers(1, 6, n_results).astype(str)
+        sight_reading = rng.integers(1, 6, n_results).astype(object)
+        sight_reading[rng.random(n_results) < 0.05] = None
+        results[f"sight_reading_score_{slot}"] = sight_reading
+    results["concert_final_score"] = rng.integers(1, 6, n_results)
+    results["sight_reading_final_score"] = rng.integers(1, 7, n_results)
+
+    conn = sqlite3.connect(path)
+    pd.DataFrame(results).to_sql("results", conn, index=False, if_exists="replace")
+    pml_df.to_sql("pml", conn, index=False, if_exists="replace")
+    conn.close()
+
+    return {"results": n_results, "pml": n_pml}
+
+
+def measure(func, repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "repeat": repeat,
+    }
+
+
+def pipeline_stages(db_path, out_dir, repeat):
+    store = SQLiteStore(db_path)
+    results_raw, pml_raw = collect_dbs(store)
+
+    stages = {
+        "collect_dbs": lambda: collect_dbs(store),
+        "get_db": lambda: get_db(results_raw.copy()),
+        "clean_results": lambda: clean_results(results_raw.copy()),
+        "clean_pml": lambda: clean_pml(pml_raw.copy()),
+        "build": lambda: build(store, out_dir, chunk_rows=None),
+        "build_chunked": lambda: build(store, out_dir, chunk_rows=CHUNK_ROWS),
+        "load_clean": lambda: load_clean(out_dir),
+    }
+    report = {name: measure(func, repeat) for name, func in stages.items()}
+
+    results_df, pml_df = load_clean(out_dir)
+    derived = {
+        "search_indexes": lambda: build_search_indexes(results_df, pml_df),
+        "performance_index": lambda: PerformanceIndex(results_df, pml_df),
+        "rollup": lambda: build_rollup(results_df),
+    }
+    report.update({name: measure(func, repeat) for name, func in derived.items()})
+
+    return report, (results_df, pml_df)
+
+
+def scenarios(results_df, pml_df, repeat):
+    # what a rerun of main() does for typical filter states, minus streamlit
+    indexes = build_search_indexes(results_df, pml_df)
+    performance_index = PerformanceIndex(results_df, pml_df)
+    cube = build_rollup(results_df)
+    code = pml_df["code"].iloc[len(pml_df) // 2]
+    grade = int(pml_df["grade"].iloc[len(pml_df) // 2])
+
+    def event_filter():
+        plan = FilterPlan(results_df).equals("gen_event", "Band")
+        plan.between("year", 2010, 2020)
+        plan.execute(["year", "school", "concert_final_score"])
+
+    def chorus_levels():
+        plan = FilterPlan(results_df).equals("gen_event", "Chorus")
+        plan.contains("school_level", "High School")
+        plan.isin("conference", ["5A", "6A"])
+        plan.distinct("classification")
+        plan.execute()
+
+    def school_search():
+        plan = FilterPlan(results_df).equals("gen_event", "Band")
+        plan.rows(indexes["school_search"].search("school12"), "school_search")
+        plan.execute()
+
+    def song_search():
+        plan = FilterPlan(results_df).equals("gen_event", "Band")
+        plan.rows(indexes["song_concat"].search("fantasia"), "song_concat")
+        plan.execute()
+
+    def fuzzy_title():
+        indexes["title_fuzzy"].rank("fantsia no 12")
+
+    def pml_search():
+        rows = indexes["total_search"].search("overture")
+        pml_df.loc[rows].sort_values("code")
+
+    def rollup_summary():
+        selected = select(cube, gen_event="Chorus", school_level="High School")
+        yearly_mean(selected, "concert_final_score")
+        yearly_mean(baseline(cube, "Chorus"), "concert_final_score")
+
+    def detail_view():
+        category_ids = performance_index.category_ids("Band", grade, 2005)
+        performance_index.song_ids(code, "Band", 2005, category_ids)
+        results_df.loc[category_ids]
+
+    return {
+        func.__name__: measure(func, repeat)
+        for func in [
+            event_filter,
+            chorus_levels,
+            school_search,
+            song_search,
+            fuzzy_title,
+            pml_search,
+            rollup_summary,
+            detail_view,
+        ]
+    }
+
+
+def run(scale=1, repeat=REPEAT, seed=0, work_dir=None):
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        db_path = os.path.join(tmp, "uil.db")
+        rows = generate_db(db_path, scale, seed)
+        stages, (results_df, pml_df) = pipeline_stages(
+            db_path, os.path.join(tmp, "clean"), repeat
+        )
+
+        return {
+            "scale": scale,
+            "seed": seed,
+            "rows": rows,
+            "clean_rows": {"results": len(results_df), "pml": len(pml_df)},
+            "stages": stages,
+            "scenarios": scenarios(results_df, pml_df, repeat),
+            "environment": {
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+            },
+            "created_at": time.time(),
+        }
+
+
+def compare(report, baseline_report, tolerance=TOLERANCE):
+    # median timings more than tolerance slower than the baseline's
+    regressions = []
+    for section in ["stages", "scenarios"]:
+        for name, current in report[section].items():
+            previous = baseline_report.get(section, {}).get(name)
+            if previous is None:
+                continue
+            ratio = current["median"] / max(previous["median"], 1e-9)
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    {
+                        "name": f"{section}.{name}",
+                        "baseline": previous["median"],
+                        "current": current["median"],
+                        "ratio": round(ratio, 2),
+                    }
+                )
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time the data pipeline and the filter/search paths on "
+        "synthetic databases."
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        nargs="+",
+        default=[1],
+        help="multiples of the real table sizes, e.g. 1 10 100",
+    )
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="benchmark.json", help="report file")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    # the synthetic dates include missing ones on purpose
+    logging.getLogger("cleaning").setLevel(logging.ERROR)
+
+    reports = []
+    for scale in args.scale:
+        report = run(scale, args.repeat, args.seed)
+        reports.append(report)
+        for section in ["stages", "scenarios"]:
+            for name, timing in report[section].items():
+                print(f"{scale:>6g}x  {section:<9} {name:<18} {timing['median']:.4f}s")
+
+    with open(args.out, "w") as file:
+        json.dump({"reports": reports}, file, indent=2)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as file:
+        baselines = {report["scale"]: report for report in json.load(file)["reports"]}
+
+    failed = False
+    for report in reports:
+        if report["scale"] not in baselines:
+            print(f"no baseline at {report['scale']:g}x")
+            continue
+        for regression in compare(report, baselines[report["scale"]], args.tolerance):
+            failed = True
+            print(
+                f"{report['scale']:g}x {regression['name']}: "
+                f"{regression['baseline']:.4f}s -> {regression['current']:.4f}s "
+                f"({regression['ratio']}x)"
+            )
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import argparse
+import sys
+import time
+
+from word_bank import word_key
+from word_store import WORD_LISTS
+
+# how far a spelling attempt may be from an official word
+MAX_DISTANCE = 2
+MAX_MATCHES = 10
+
+
+class Pattern:
+    # a word prepared for bit-parallel edit distance (Myers/Hyyrö): one bit
+    # mask of positions per character, so each character of the other word
+    # costs a handful of integer operations instead of a row of the table
+    __slots__ = ["text", "masks", "all", "last"]
+
+    def __init__(self, text):
+        self.text = text
+        self.masks = {}
+        for position, char in enumerate(text):
+            self.masks[char] = self.masks.get(char, 0) | 1 << position
+        self.all = (1 << len(text)) - 1
+        self.last = 1 << (len(text) - 1) if text else 0
+
+    def distance(self, other):
+        if not self.text:
+            return len(other)
+
+        masks, all_bits, last = self.masks, self.all, self.last
+        positive, negative, score = all_bits, 0, len(self.text)
+        for char in other:
+            match = masks.get(char, 0)
+            vertical = match | negative
+            horizontal = (((match & positive) + positive) ^ positive) | match
+            h_positive = negative | ~(horizontal | positive) & all_bits
+            h_negative = positive & horizontal
+            if h_positive & last:
+                score += 1
+            elif h_negative & last:
+                score -= 1
+            h_positive = (h_positive << 1 | 1) & all_bits
+            h_negative = (h_negative << 1) & all_bits
+            positive = h_negative | ~(vertical | h_positive) & all_bits
+            negative = h_positive & vertical
+
+        return score
+
+
+def levenshtein(a, b, limit=None):
+    # edit distance, capped at limit + 1 when a limit is given
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    distance = Pattern(a).distance(b)
+    return distance if limit is None else min(distance, limit + 1)
+
+
+class BKTree:
+    # a metric tree over the word keys: every child hangs off its parent at
+    # its distance from it, so the triangle inequality rules out whole
+    # subtrees; spellings sharing a key ("food chain", "foodchain") share a
+    # node
+    def __init__(self, words=()):
+        self.root = None
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        key = word_key(word)
+        if not key:
+            return
+        if self.root is None:
+            self.root = (key, [word], {})
+            self.size += 1
+            return
+
+        pattern = Pattern(key)
+        node = self.root
+        while True:
+            node_key, node_words, children = node
+            distance = pattern.distance(node_key)
+            if distance == 0:
+                if word not in node_words:
+                    node_words.append(word)
+                    self.size += 1
+                return
+            child = children.get(distance)
+            if child is None:
+                children[distance] = (key, [word], {})
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word, max_distance=MAX_DISTANCE):
+        # (distance, word) of every word within max_distance, closest first
+        key = word_key(word)
+        if not key or self.root is None:
+            return []
+
+        pattern = Pattern(key)
+        matches = []
+        stack = [self.root]
+        while stack:
+            node_key, node_words, children = stack.pop()
+            distance = pattern.distance(node_key)
+            if distance <= max_distance:
+                matches.extend((distance, node_word) for node_word in node_words)
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(
+                child for edge, child in children.items() if low <= edge <= high
+            )
+
+        matches.sort()
+        return matches
+
+    def closest(self, word, n=MAX_MATCHES, max_distance=MAX_DISTANCE):
+        return self.search(word, max_distance)[:n]
+
+    def __len__(self):
+        return self.size
+
+
+def confusable_pairs(words, max_distance=MAX_DISTANCE):
+    # every pair of words within max_distance of each other, closest first;
+    # each word is looked up among the words before it and then added, so
+    # every pair is found once
+    tree = BKTree()
+    pairs = []
+    for word in words:
+        for distance, other in tree.search(word, max_distance):
+            if distance > 0:
+                pairs.append((distance, *sorted([word, other])))
+        tree.add(word)
+
+    return sorted(set(pairs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="List the confusable spellings of the word lists."
+    )
+    parser.add_argument("names", nargs="*", help="lists, e.g. 2024/spelling")
+    parser.add_argument("--distance", type=int, default=MAX_DISTANCE)
+    args = parser.parse_args(argv)
+
+    words = WORD_LISTS.bank(args.names or None).words
+    start = time.perf_counter()
+    pairs = confusable_pairs(words, args.distance)
+    seconds = time.perf_counter() - start
+
+    for distance, a, b in pairs:
+        print(f"{distance}  {a} / {b}")
+    print(
+        f"{len(pairs)} pairs within {args.distance} of {len(words)} words, "
+        f"{seconds:.3f}s",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
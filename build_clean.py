@@ -0,0 +1,341 @@
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cleaning import CLEANING_VERSION, clean_all, clean_pml, clean_results
+from profiling import span
+from rollups import build_rollup, merge
+from schema import concat_frames, memory_usage, sort_categories
+from storage import (
+    DB_PATH,
+    PARQUET_DIR,
+    PML_COLUMNS,
+    RESULTS_COLUMNS,
+    arrow_types,
+    open_store,
+)
+
+CLEAN_DIR = "clean"
+MANIFEST_NAME = "manifest.json"
+RESULTS_FILE = "results_clean.parquet"
+PML_FILE = "pml_clean.parquet"
+ROLLUP_FILE = "rollup.parquet"
+# cleaned rows of one ingested batch, see ingest.py
+DELTA_FILE = "results_delta_{version}.parquet"
+
+# clean the results table this many rows at a time instead of all at once,
+# e.g. UIL_CHUNK_ROWS=50000 for histories that don't fit in memory raw
+CHUNK_ROWS = int(os.environ.get("UIL_CHUNK_ROWS") or 0) or None
+
+
+def collect_dbs(store=None):
+    store = store or open_store()
+    results_df = store.read("results", RESULTS_COLUMNS)
+    pml_df = store.read("pml", PML_COLUMNS)
+
+    return results_df, pml_df
+
+
+def read_manifest(out_dir=CLEAN_DIR):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(manifest, out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _typed(df):
+    # object columns mixing "" with numbers can't be typed by arrow
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True) != "string":
+            df[col] = df[col].astype(str)
+
+    return df
+
+
+def _write_parquet(df, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    _typed(df).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _chunk_schema(schema):
+    # each chunk's categoricals get their own dictionary and the narrowest
+    # code type, widen the codes so every chunk fits the first one's schema
+    return pa.schema(
+        [
+            (
+                field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+                if pa.types.is_dictionary(field.type)
+                else field
+            )
+            for field in schema
+        ],
+        metadata=schema.metadata,
+    )
+
+
+def _write_chunks(chunks, path):
+    # cleaned chunks are appended to one file as they arrive, only the first
+    # non-empty chunk is kept around to settle the schema
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    writer = None
+    empty = None
+    try:
+        for df in chunks:
+            if df.empty:
+                empty = df
+                continue
+            table = pa.Table.from_pandas(_typed(df), preserve_index=False)
+            if writer is None:
+                schema = _chunk_schema(table.schema)
+                writer = pq.ParquetWriter(tmp_path, schema)
+            writer.write_table(table.cast(schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        # nothing survived the cleaning
+        _write_parquet(empty, path)
+    else:
+        os.replace(tmp_path, path)
+
+
+def _build_chunked(store, out_dir, chunk_rows):
+    # only one raw chunk and its cleaned copy are in memory at a time, the
+    # rollup is folded together from the chunks' rollups on the way
+    totals = {"rows": 0, "memory_bytes": 0, "rollup": None}
+
+    def cleaned():
+        for raw in store.read_chunks("results", RESULTS_COLUMNS, chunk_rows):
+            with span("build.clean_chunk"):
+                df = clean_results(raw)
+            totals["rows"] += len(df)
+            totals["memory_bytes"] += memory_usage(df)
+            totals["rollup"] = merge(totals["rollup"], build_rollup(df))
+            yield df
+
+    with span("build.results"):
+        _write_chunks(cleaned(), os.path.join(out_dir, RESULTS_FILE))
+    with span("build.pml"):
+        pml_df = clean_pml(store.read("pml", PML_COLUMNS))
+        _write_parquet(pml_df, os.path.join(out_dir, PML_FILE))
+
+    return totals["rows"], totals["memory_bytes"], totals["rollup"], pml_df
+
+
+def build(store=None, out_dir=CLEAN_DIR, fingerprint=None, chunk_rows=CHUNK_ROWS):
+    start = time.time()
+    store = store or open_store()
+    fingerprint = fingerprint or store.fingerprint()
+    os.makedirs(out_dir, exist_ok=True)
+
+    if chunk_rows:
+        rows, results_bytes, rollup, pml_df = _build_chunked(store, out_dir, chunk_rows)
+    else:
+        with span("build.collect"):
+            raw = collect_dbs(store)
+        results_df, pml_df = clean_all(*raw)
+        del raw
+
+        with span("build.write"):
+            _write_parquet(results_df, os.path.join(out_dir, RESULTS_FILE))
+            _write_parquet(pml_df, os.path.join(out_dir, PML_FILE))
+        rows, results_bytes = len(results_df), memory_usage(results_df)
+        rollup = build_rollup(results_df)
+        del results_df
+
+    # the app reads the stored rollup instead of grouping the whole table
+    _write_parquet(rollup, os.path.join(out_dir, ROLLUP_FILE))
+
+    # a full build already contains every ingested batch
+    manifest = {
+        "build_id": uuid.uuid4().hex,
+        "source": [os.path.abspath(path) for path in store.paths],
+        "store": store.kind,
+        "fingerprint": fingerprint,
+        "cleaning_version": CLEANING_VERSION,
+        "built_at": time.time(),
+        "build_seconds": round(time.time() - start, 3),
+        "chunk_rows": chunk_rows,
+        "rows": {"results": rows, "pml": len(pml_df)},
+        "memory_bytes": {
+            "results": results_bytes,
+            "pml": memory_usage(pml_df),
+        },
+        "rollup": ROLLUP_FILE,
+        "deltas": [],
+    }
+    _write_manifest(manifest, out_dir)
+
+    # the batches are part of the base tables now
+    for file_name in os.listdir(out_dir):
+        if file_name.startswith("results_delta_"):
+            os.remove(os.path.join(out_dir, file_name))
+
+    return manifest
+
+
+def append_delta(results_delta, version, store, out_dir=CLEAN_DIR, source=None):
+    # store the cleaned rows of an ingested batch next to the base tables
+    # instead of rebuilding them, running apps merge it in on their next run
+    manifest = read_manifest(out_dir)
+
+    file_name = DELTA_FILE.format(version=version)
+    _write_parquet(results_delta, os.path.join(out_dir, file_name))
+
+    manifest["deltas"] = manifest.get("deltas", []) + [
+        {
+            "version": version,
+            "file": file_name,
+            "source": source,
+            "rows": len(results_delta),
+            "ingested_at": time.time(),
+        }
+    ]
+    manifest["rows"]["results"] += len(results_delta)
+    manifest["store"] = store.kind
+    manifest["source"] = [os.path.abspath(path) for path in store.paths]
+    manifest["fingerprint"] = store.fingerprint()
+    _write_manifest(manifest, out_dir)
+
+    return manifest
+
+
+def ensure_clean(store=None, out_dir=CLEAN_DIR, force=False, chunk_rows=CHUNK_ROWS):
+    store = store or open_store()
+    manifest = read_manifest(out_dir)
+
+    if manifest and not force and manifest.get("cleaning_version") == CLEANING_VERSION:
+        fingerprint = store.fingerprint(previous=manifest["fingerprint"])
+
+        if fingerprint is manifest["fingerprint"]:
+            return manifest
+
+        # touched but not modified, just remember the new stat
+        if fingerprint["sha256"] == manifest["fingerprint"]["sha256"]:
+            manifest["fingerprint"] = fingerprint
+            _write_manifest(manifest, out_dir)
+            return manifest
+
+        return build(store, out_dir, fingerprint, chunk_rows)
+
+    return build(store, out_dir, chunk_rows=chunk_rows)
+
+
+def _read_parquet(path):
+    # free each arrow column once it is converted instead of holding the
+    # whole table and the frame at the same time
+    return sort_categories(
+        pq.read_table(path).to_pandas(
+            types_mapper=arrow_types, split_blocks=True, self_destruct=True
+        )
+    )
+
+
+def load_deltas(manifest, out_dir=CLEAN_DIR, start=0):
+    return [
+        _read_parquet(os.path.join(out_dir, delta["file"]))
+        for delta in manifest.get("deltas", [])[start:]
+    ]
+
+
+def load_clean(out_dir=CLEAN_DIR, manifest=None):
+    manifest = manifest or read_manifest(out_dir) or {}
+
+    results_df = _read_parquet(os.path.join(out_dir, RESULTS_FILE))
+    deltas = load_deltas(manifest, out_dir)
+    if deltas:
+        results_df = concat_frames([results_df] + deltas)
+    pml_df = _read_parquet(os.path.join(out_dir, PML_FILE))
+
+    return results_df, pml_df
+
+
+def load_rollup(manifest, out_dir=CLEAN_DIR, results_df=None):
+    # the stored rollup plus the ingested batches, None for builds that
+    # predate it
+    if not manifest.get("rollup"):
+        return None
+
+    rollup = _read_parquet(os.path.join(out_dir, manifest["rollup"]))
+    delta_rows = sum(delta["rows"] for delta in manifest.get("deltas", []))
+    if delta_rows:
+        results_delta = (
+            concat_frames(load_deltas(manifest, out_dir))
+            if results_df is None
+            else results_df.iloc[len(results_df) - delta_rows :]
+        )
+        rollup = merge(rollup, build_rollup(results_delta))
+
+    return rollup
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Clean uil.db once and store the results/pml tables as Parquet."
+    )
+    parser.add_argument("--db", default=DB_PATH, help="source SQLite database")
+    parser.add_argument(
+        "--parquet",
+        default=PARQUET_DIR,
+        help="Parquet export used instead of --db when it is up to date",
+    )
+    parser.add_argument("--out", default=CLEAN_DIR, help="output directory")
+    parser.add_argument(
+        "--force", action="store_true", help="rebuild even if the source is unchanged"
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=CHUNK_ROWS,
+        help="clean the results this many rows at a time to bound memory",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="only report whether the stored tables are up to date",
+    )
+    args = parser.parse_args(argv)
+
+    store = open_store(args.db, args.parquet)
+
+    if args.check:
+        manifest = read_manifest(args.out)
+        current = (
+            manifest is not None
+            and manifest.get("cleaning_version") == CLEANING_VERSION
+            and store.fingerprint()["sha256"] == manifest["fingerprint"]["sha256"]
+        )
+        print("up to date" if current else "stale")
+        return 0 if current else 1
+
+    manifest = ensure_clean(
+        store, args.out, force=args.force, chunk_rows=args.chunk_rows
+    )
+    print(
+        f"{manifest['rows']['results']} results and {manifest['rows']['pml']} pml rows "
+        f"in {args.out} (built in {manifest['build_seconds']}s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
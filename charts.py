@@ -0,0 +1,280 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from filter_cache import FilterCache
+from profiling import span
+
+# altair and plotly are imported by the builders, only when a chart is drawn;
+# importing them here added about 0.4s to every cold start
+
+# figures kept per process, the cache counts entries rather than bytes
+MAX_CHARTS = 64
+
+# bubbles drawn individually, the rest are binned into density bubbles so
+# the spec stays the same size however broad the filter is
+MAX_BUBBLES = 300
+DENSITY_BINS = 24
+
+SELECTED_COLOR = "#FF4B4B"
+ALL_COLOR = "#184883"
+
+BUBBLE_COLUMNS = [
+    "title",
+    "composer",
+    "event_name",
+    "average_concert_score",
+    "average_sight_reading_score",
+    "performance_count",
+]
+
+
+def new_chart_cache(max_charts=MAX_CHARTS):
+    return FilterCache(max_charts, getsizeof=lambda chart: 1)
+
+
+def input_hash(*values):
+    digest = hashlib.sha1()
+    for value in values:
+        if isinstance(value, (pd.Series, pd.DataFrame)):
+            digest.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+            names = value.columns if isinstance(value, pd.DataFrame) else [value.name]
+            digest.update(repr(list(names)).encode())
+        else:
+            digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+
+def cached_chart(cache, build, *inputs):
+    # the figure is only rebuilt when its inputs change
+    with span(f"chart.{build.__name__}"):
+        return cache.get((build.__name__, input_hash(*inputs)), lambda: build(*inputs))
+
+
+def score_line_chart(selected_by_year, all_by_year):
+    import plotly.graph_objs as go
+
+    line_chart = go.Figure(
+        data=[
+            go.Scatter(
+                x=selected_by_year.index,  # Use the index of the series
+                y=selected_by_year.values,
+                mode="lines",
+                name="Selected Results",
+                line=dict(color=SELECTED_COLOR, width=2),
+            ),
+            go.Scatter(
+                x=all_by_year.index,  # Use the index of the series
+                y=all_by_year.values,
+                mode="lines",
+                name="All Results",
+                line=dict(color=ALL_COLOR, width=2),
+            ),
+        ]
+    )
+
+    line_chart.update_yaxes(autorange="reversed")
+
+    # Update layout to optimize the legend for mobile
+    line_chart.update_layout(
+        legend=dict(
+            orientation="h",  # Horizontal legend
+            yanchor="bottom",  # Align legend at the bottom
+            y=0,  # Position the legend at the bottom
+            xanchor="right",  # Align legend to the right
+            x=1,  # Position legend to the right
+            font=dict(size=10),  # Smaller font size
+            bgcolor="rgba(255, 255, 255, 0.5)",  # Transparent background
+        ),
+        margin=dict(l=20, r=20, t=20, b=20),  # Compact margins
+    )
+
+    return line_chart
+
+
+def score_pie_chart(counts):
+    import plotly.graph_objs as go
+
+    return go.Figure(
+        data=[
+            go.Pie(
+                labels=counts.index,
+                values=counts.values,
+                hole=0.5,
+            )
+        ]
+    )
+
+
+def downsample_bubbles(graphed_pml, limit=MAX_BUBBLES, bins=DENSITY_BINS):
+    # the most performed titles keep their own bubble and tooltip, the long
+    # tail is summed per cell of a log-spaced grid
+    top = graphed_pml.nlargest(limit, "performance_count")
+    rest = graphed_pml.drop(top.index)
+    if rest.empty:
+        return top, None
+
+    x = np.log10(rest["average_concert_score"])
+    y = np.log10(rest["average_sight_reading_score"])
+    cells = rest.groupby([pd.cut(x, bins, labels=False), pd.cut(y, bins, labels=False)])
+    density = pd.DataFrame(
+        {
+            "average_concert_score": cells["average_concert_score"].mean(),
+            "average_sight_reading_score": cells["average_sight_reading_score"].mean(),
+            "performance_count": cells["performance_count"].sum(),
+            "titles": cells.size(),
+        }
+    ).reset_index(drop=True)
+
+    return top, density
+
+
+def pml_bubble_chart(graphed_pml):
+    import altair as alt
+
+    max_x = graphed_pml["average_concert_score"].max()
+    max_y = graphed_pml["average_sight_reading_score"].max()
+
+    x = alt.X(
+        "average_concert_score",
+        scale=alt.Scale(type="log", domain=(1, max_x)),
+    )
+    y = alt.Y(
+        "average_sight_reading_score",
+        scale=alt.Scale(type="log", domain=(1, max_y)),
+    )
+    size = alt.Size(
+        "performance_count",
+        legend=None,
+        scale=alt.Scale(range=[2, 3000]),
+    )
+
+    top, density = downsample_bubbles(graphed_pml)
+
+    bubbles = (
+        alt.Chart(top)
+        .mark_circle()
+        .encode(
+            x=x,
+            y=y,
+            color=alt.Color("event_name", legend=None),
+            size=size,
+            tooltip=[
+                "title",
+                "composer",
+                "event_name",
+                "average_concert_score",
+                "average_sight_reading_score",
+            ],
+        )
+    )
+    if density is None:
+        return bubbles.interactive()
+
+    rest = (
+        alt.Chart(density)
+        .mark_circle(color="lightgray", opacity=0.5)
+        .encode(
+            x=x,
+            y=y,
+            size=size,
+            tooltip=[
+                alt.Tooltip("titles", title="Other titles"),
+                alt.Tooltip("performance_count", title="Performances"),
+            ],
+        )
+    )
+
+    return alt.layer(rest, bubbles).interactive()
+
+
+def song_history_chart(song_performances, title):
+    import plotly.graph_objs as go
+    from plotly.subplots import make_subplots
+
+    # Group by year and count the performances, then rename the column to 'count'
+    song_performances_count = (
+        song_performances.groupby("year").size().reset_index(name="count")
+    )
+
+    # Grouping and preparing data
+    song_performances_avg_score = (
+        song_performances.groupby("year")["concert_final_score"].mean().sort_index()
+    )
+
+    # Create a subplot with shared x-axis and two y-axes
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+
+    # Add the 'count' bar chart (primary y-axis)
+    fig.add_trace(
+        go.Bar(
+            x=song_performances_count["year"],
+            y=song_performances_count["count"],
+            name="Performance Count",
+            marker_color="rgba(55, 83, 109, 0.7)",  # Color for bars
+        ),
+        secondary_y=False,
+    )
+
+    # Add the 'average concert score' line chart (secondary y-axis)
+    fig.add_trace(
+        go.Scatter(
+            x=song_performances_avg_score.index,
+            y=song_performances_avg_score,
+            mode="lines+markers",  # Adds markers to the line
+            name="Avg. Concert Score",
+            line=dict(color="rgb(26, 118, 255)"),  # Color for line
+        ),
+        secondary_y=True,
+    )
+
+    # Update layout with titles and legends
+    fig.update_layout(
+        title_text=f"Performances (Bar) and Avg. Concert Scores (Line) for {title}",
+        showlegend=False,
+        xaxis=dict(title="Year"),
+    )
+
+    # Update y-axis titles
+    fig.update_yaxes(title_text="Performance Count", secondary_y=False, showgrid=False)
+    min_value = song_performances_avg_score.max()
+    fig.update_xaxes(showgrid=False)  # Disable gridlines across x-axis
+    fig.update_yaxes(
+        title_text="Avg. Concert Score",
+        secondary_y=True,
+        range=[min_value + 0.5, 0.5],
+        autorange=False,
+    )
+
+    return fig
+
+
+def performance_share_chart(title, count, total, earliest_year, event, grade):
+    import plotly.express as px
+
+    pie_remaining = px.pie(
+        values=[count, total - count],
+        names=[
+            f"{title}",
+            f"All Other Songs in category since {earliest_year}",
+        ],
+        title=f"Share of {event} grade {grade} performances",
+        color_discrete_sequence=[ALL_COLOR, SELECTED_COLOR],
+    )
+
+    # Update the layout to anchor the legend at the bottom
+    pie_remaining.update_layout(
+        legend=dict(
+            orientation="h",  # Horizontal legend
+            yanchor="bottom",  # Align legend at the bottom
+            y=-0.1,  # Position legend just below the chart
+            xanchor="center",  # Center the legend horizontally
+            x=0.5,  # Center the legend in the middle of the chart
+            font=dict(size=10),  # Optional: Adjust font size if needed
+            bgcolor="rgba(255, 255, 255, 0.1)",  # Optional: Transparent backgro
+        ),
+        margin=dict(l=20, r=20, t=100, b=50),  # Adjust margins if necessary
+    )
+
+    return pie_remaining
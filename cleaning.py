@@ -0,0 +1,246 @@
+import logging
+
+import pandas as pd
+
+from profiling import timed
+from schema import PML_SCHEMA, RESULTS_SCHEMA, apply_schema
+
+# bump whenever the cleaning rules change so stored artifacts get rebuilt
+CLEANING_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+
+@timed("cleaning.normalize_dates")
+def normalize_dates(dates):
+    # contest_date mixes Timestamps and "YYYY-MM-DD HH:MM" strings,
+    # keep the date part of either and parse them all at once
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates.dt.normalize()
+
+    text = dates.astype("string")
+    day = text.str.split(" ", n=1).str[0]
+    parsed = pd.to_datetime(day, format="%Y-%m-%d", errors="coerce")
+
+    bad = parsed.isna()
+    if bad.any():
+        examples = text[bad].fillna("<missing>").unique()[:5]
+        logger.warning(
+            "%d of %d contest dates could not be parsed (e.g. %s)",
+            bad.sum(),
+            len(dates),
+            ", ".join(examples),
+        )
+
+    return parsed
+
+
+@timed("cleaning.get_db")
+def get_db(df):
+    score_subset = [
+        "concert_score_1",
+        "concert_score_2",
+        "concert_score_3",
+        "concert_final_score",
+        "sight_reading_score_1",
+        "sight_reading_score_2",
+        "sight_reading_score_3",
+        "sight_reading_final_score",
+    ]
+
+    df["contest_date"] = normalize_dates(df["contest_date"])
+
+    df["year"] = df["contest_date"].dt.year
+    df = df.dropna(subset=["year"])
+    df["year"] = df["year"].astype(int)
+
+    # create event_search
+    df["event_search"] = df["event"]
+    # fix event col
+    # create event_search
+    df["event_search"] = df["event"]
+    # fix event col
+    df["event"] = df["event"].str.replace("tenor/bass chorus", "Tenor-Bass Chorus")
+    df["event"] = df["event"].str.replace("mixed chorus", "Mixed Chorus")
+    df["event"] = df["event"].str.replace("string orchestra", "String Orchestra")
+    df["event"] = df["event"].str.replace("full orchestra", "Full Orchestra")
+    df["event"] = df["event"].str.replace("treble chorus", "Treble Chorus")
+    df["event"] = df["event"].str.title()
+    # drop any rows where all scores are na
+    df = df.dropna(subset=score_subset, how="all")
+
+    # force numeric scores to be numeric
+    df[score_subset] = df[score_subset].apply(pd.to_numeric, errors="coerce")
+
+    # fill everything else with ""
+    cols_not_in_subset = df.columns.difference(score_subset)
+    df[cols_not_in_subset] = df[cols_not_in_subset].fillna("")
+
+    df["song_concat"] = df["title_1"] + " " + df["title_2"] + " " + df["title_3"]
+    df["composer_concat"] = (
+        df["composer_1"] + " " + df["composer_2"] + " " + df["composer_3"]
+    )
+    # remove any non-alphanumeric characters and spaces
+    df["song_concat"] = df["song_concat"].str.replace(r"[^\w\s]", "")
+    df["song_concat"] = df["song_concat"].str.replace(" ", "")
+
+    df["composer_concat"] = df["composer_concat"].str.replace(r"[^\w\s]", "")
+    df["composer_concat"] = df["composer_concat"].str.replace(r" ", "")
+
+    # make all characters lowercase
+    df["song_concat"] = df["song_concat"].str.lower()
+    df["composer_concat"] = df["composer_concat"].str.lower()
+
+    # fix school names
+    df["school_search"] = df["school"].str.strip().str.lower()
+    df["school_search"] = df["school_search"].str.replace(r"[^\w\s]", "")
+    df["school_search"] = df["school_search"].str.replace(r" ", "")
+
+    return df
+
+
+@timed("cleaning.clean_results")
+def clean_results(results_df):
+
+    results_df = get_db(results_df)
+
+    # fill na with 0
+    results_df = results_df.fillna(0)
+
+    results_df = results_df[results_df["concert_score_1"] != 0]
+    results_df = results_df[results_df["concert_score_2"] != 0]
+    results_df = results_df[results_df["concert_score_3"] != 0]
+    results_df = results_df[results_df["concert_final_score"] != 0]
+    results_df = results_df[results_df["sight_reading_score_1"] != 0]
+    results_df = results_df[results_df["sight_reading_score_2"] != 0]
+    results_df = results_df[results_df["sight_reading_score_3"] != 0]
+    results_df = results_df[results_df["sight_reading_final_score"] != 0]
+
+    # fix the sight reading score above 5 to just 5
+    results_df.loc[
+        results_df["sight_reading_final_score"] > 5, "sight_reading_final_score"
+    ] = 5
+
+    # change all concert scores to int
+    results_df["concert_score_1"] = (
+        results_df["concert_score_1"].astype(float).astype(int)
+    )
+    results_df["concert_score_2"] = (
+        results_df["concert_score_2"].astype(float).astype(int)
+    )
+    results_df["concert_score_3"] = (
+        results_df["concert_score_3"].astype(float).astype(int)
+    )
+    results_df["concert_final_score"] = (
+        results_df["concert_final_score"].astype(float).astype(int)
+    )
+    results_df["sight_reading_score_1"] = (
+        results_df["sight_reading_score_1"].astype(float).astype(int)
+    )
+    results_df["sight_reading_score_2"] = (
+        results_df["sight_reading_score_2"].astype(float).astype(int)
+    )
+    results_df["sight_reading_score_3"] = (
+        results_df["sight_reading_score_3"].astype(float).astype(int)
+    )
+    results_df["sight_reading_final_score"] = (
+        results_df["sight_reading_final_score"].astype(float).astype(int)
+    )
+
+    # add columns called Choice 1, Choice 2, and Choice 3 where title and composer are combined
+    results_df["choice_1"] = results_df["title_1"] + "–" + results_df["composer_1"]
+    results_df["choice_2"] = results_df["title_2"] + "–" + results_df["composer_2"]
+    results_df["choice_3"] = results_df["title_3"] + "–" + results_df["composer_3"]
+    results_df.loc[:, "choice_1"] = results_df["choice_1"].str.title()
+    results_df.loc[:, "choice_2"] = results_df["choice_2"].str.title()
+    results_df.loc[:, "choice_3"] = results_df["choice_3"].str.title()
+
+    results_df["school_level"] = ""
+    results_df.loc[
+        results_df["conference"].str.contains("A", na=False), "school_level"
+    ] = "High School"
+    results_df.loc[
+        results_df["conference"].str.contains("C", na=False), "school_level"
+    ] = "Middle School/JH"
+
+    # change classification to title case
+    results_df["classification"] = results_df["classification"].str.replace("-", " ")
+    results_df["classification"] = results_df["classification"].str.title()
+    results_df.loc[
+        results_df["classification"].str.contains("Nv", na=False), "classification"
+    ] = "Non Varsity"
+    # if classification begins with "V" it is Varsit
+    results_df.loc[
+        results_df["classification"].str.contains(r"^V", na=False), "classification"
+    ] = "Varsity"
+
+    return apply_schema(results_df, RESULTS_SCHEMA)
+
+
+@timed("cleaning.clean_pml")
+def clean_pml(pml):
+
+    pml[["arranger", "composer", "specification"]] = pml[
+        ["arranger", "composer", "specification"]
+    ].fillna("")
+
+    # only keep rows where event contains band, chorus, or orchestra
+    pml = pml[
+        pml["event_name"]
+        .str.lower()
+        .str.contains("band|chorus|orchestra|madrigal", na=False)
+    ]
+
+    # change fullorchestra to Full Orchestra
+    pml.loc[:, "event_name"] = (
+        pml.loc[:, "event_name"]
+        .str.replace("fullorchestra", "Full Orchestra")
+        .str.replace("mixedchorus", "Mixed Chorus")
+        .str.replace("stringorchestra", "String Orchestra")
+        .str.replace("tenorbasschorus", "Tenor-Bass Chorus")
+        .str.replace("treblechorus", "Treble Chorus")
+        .str.title()
+    )
+
+    # drop and steelband rows
+    pml = pml[~pml["event_name"].str.contains("steelband", na=False)]
+
+    # remove any rows where grade is not an int
+    pml = pml[pml["grade"].isna() == False]
+
+    # make sure grade is int
+    try:
+        # Convert "grade" to float, filter out NaN values, then convert to int
+        pml["grade"] = pml["grade"].astype(float)
+        pml = pml[pml["grade"].notna()]
+        pml["grade"] = pml["grade"].astype(int)
+    except ValueError:
+        pml["grade"] = pml["grade"].str.extract(r"(\d+)", expand=False)
+        pml["grade"] = pml["grade"].astype(int)
+
+    pml["song_search"] = pml["title"].str.lower()
+    pml["song_search"] = pml["song_search"].str.replace(r"[^\w\s]", "")
+    pml["song_search"] = pml["song_search"].str.replace(r" ", "")
+
+    pml["composer_search"] = pml["composer"].str.lower() + pml["arranger"].str.lower()
+    pml["composer_search"] = pml["composer_search"].str.replace(r"[^\w\s]", "")
+
+    pml["total_search"] = (
+        pml["song_search"] + pml["composer_search"] + pml["specification"]
+    )
+    pml["total_search"] = (
+        pml["total_search"].str.replace(r"[^\w\s]", "", regex=True).str.lower()
+    )
+    pml["total_search"] = pml["total_search"].str.replace(r" ", "")
+    # replace anything that is not a-z with ""
+    pml["total_search"] = pml["total_search"].str.replace(r"[^a-zA-Z]", "", regex=True)
+
+    # fill na with 0
+    pml["performance_count"] = pml["performance_count"].fillna(0)
+
+    return apply_schema(pml, PML_SCHEMA)
+
+
+def clean_all(results_df, pml_df):
+
+    return clean_results(results_df), clean_pml(pml_df)
@@ -0,0 +1,176 @@
+import threading
+
+import pandas as pd
+
+from build_clean import CLEAN_DIR, ensure_clean, load_clean, load_deltas, load_rollup
+from filter_cache import FilterCache
+from performance_index import PerformanceIndex
+from profiling import span
+from rollups import build_rollup, merge
+from schema import concat_frames
+from search_index import build_search_indexes
+from shared_frames import (
+    SHARED_DIR,
+    PublisherLock,
+    map_version,
+    publish,
+    read_pointer,
+    version_name,
+)
+
+TEXT_INDEXES = ["school_search", "song_concat", "composer_concat"]
+
+
+def _deltas(manifest):
+    return [delta["version"] for delta in manifest.get("deltas", [])]
+
+
+class Snapshot:
+    # the frames and everything derived from them for one version of the
+    # cleaned tables, never modified once built
+    def __init__(
+        self, results_df, pml_df, search_indexes, performance_index, rollup, manifest
+    ):
+        self.results_df = results_df
+        self.pml_df = pml_df
+        self.search_indexes = search_indexes
+        self.performance_index = performance_index
+        self.rollup = rollup
+        self.filter_cache = FilterCache()
+        self.build_id = manifest.get("build_id")
+        self.deltas = _deltas(manifest)
+        self.version = manifest["fingerprint"]["sha256"]
+        self.name = version_name(manifest)
+
+    @classmethod
+    def load(cls, manifest, out_dir=CLEAN_DIR):
+        with span("load.frames"):
+            results_df, pml_df = load_clean(out_dir, manifest)
+        with span("load.stored_rollup"):
+            rollup = load_rollup(manifest, out_dir, results_df)
+        return cls.from_frames(results_df, pml_df, manifest, rollup)
+
+    @classmethod
+    def from_frames(cls, results_df, pml_df, manifest, rollup=None):
+        with span("load.search_indexes"):
+            search_indexes = build_search_indexes(results_df, pml_df)
+        with span("load.performance_index"):
+            performance_index = PerformanceIndex(results_df, pml_df)
+        if rollup is None:
+            with span("load.rollup"):
+                rollup = build_rollup(results_df)
+
+        return cls(
+            results_df, pml_df, search_indexes, performance_index, rollup, manifest
+        )
+
+    def extended(self, manifest, out_dir=CLEAN_DIR, results_df=None, pml_df=None):
+        # merge only the batches ingested since this snapshot was built,
+        # results_df is passed when the merged frame already exists (shared)
+        start = len(self.results_df)
+        if results_df is None:
+            results_delta = concat_frames(
+                load_deltas(manifest, out_dir, start=len(self.deltas))
+            )
+            results_delta.index = pd.RangeIndex(start, start + len(results_delta))
+            results_df = concat_frames([self.results_df, results_delta])
+        else:
+            results_delta = results_df.iloc[start:]
+
+        search_indexes = dict(self.search_indexes)
+        for name in TEXT_INDEXES:
+            search_indexes[name] = search_indexes[name].extended(results_delta[name])
+        search_indexes["title_fuzzy"] = search_indexes["title_fuzzy"].extended(
+            *[results_delta[f"title_{i}"] for i in (1, 2, 3)]
+        )
+        search_indexes["composer_fuzzy"] = search_indexes["composer_fuzzy"].extended(
+            *[results_delta[f"composer_{i}"] for i in (1, 2, 3)]
+        )
+
+        return Snapshot(
+            results_df,
+            self.pml_df if pml_df is None else pml_df,
+            search_indexes,
+            self.performance_index.extended(results_delta),
+            merge(self.rollup, build_rollup(results_delta)),
+            manifest,
+        )
+
+    def extends_to(self, manifest):
+        deltas = _deltas(manifest)
+        return (
+            self.build_id is not None
+            and manifest.get("build_id") == self.build_id
+            and deltas[: len(self.deltas)] == self.deltas
+            and len(deltas) > len(self.deltas)
+        )
+
+
+class Dataset:
+    # the current snapshot of one process, swapped whole when the cleaned
+    # tables change so readers never see a half-merged state
+    def __init__(self, out_dir=CLEAN_DIR, shared_dir=SHARED_DIR):
+        self.out_dir = out_dir
+        self.shared_dir = shared_dir
+        self.snapshot = None
+        self._lock = threading.Lock()
+        self._publisher = PublisherLock(shared_dir) if shared_dir else None
+
+    def _current(self, manifest):
+        snapshot = self.snapshot
+        return (
+            snapshot is not None
+            and snapshot.build_id == manifest.get("build_id")
+            and snapshot.deltas == _deltas(manifest)
+            and snapshot.version == manifest["fingerprint"]["sha256"]
+        )
+
+    def refresh(self):
+        if self.shared_dir:
+            return self._refresh_shared()
+
+        manifest = ensure_clean(out_dir=self.out_dir)
+        if self._current(manifest):
+            return self.snapshot
+
+        with self._lock:
+            # another session may have caught up while we waited
+            if not self._current(manifest):
+                snapshot = self.snapshot
+                if snapshot is not None and snapshot.extends_to(manifest):
+                    self.snapshot = snapshot.extended(manifest, self.out_dir)
+                else:
+                    self.snapshot = Snapshot.load(manifest, self.out_dir)
+
+            return self.snapshot
+
+    def _refresh_shared(self):
+        # one process cleans and publishes the frames, every process
+        # (the publisher too) maps the published files instead of
+        # holding its own copy
+        if self._publisher.acquire():
+            manifest = ensure_clean(out_dir=self.out_dir)
+            pointer = read_pointer(self.shared_dir)
+            if pointer is None or pointer["version"] != version_name(manifest):
+                results_df, pml_df = load_clean(self.out_dir, manifest)
+                publish(results_df, pml_df, manifest, self.shared_dir)
+                del results_df, pml_df
+
+        pointer = read_pointer(self.shared_dir)
+        if pointer is None:
+            # nothing published yet, keep waiting for the publisher
+            return self.snapshot
+
+        with self._lock:
+            snapshot = self.snapshot
+            if snapshot is None or snapshot.name != pointer["version"]:
+                manifest = pointer["manifest"]
+                results_df, pml_df = map_version(pointer, self.shared_dir)
+                if snapshot is not None and snapshot.extends_to(manifest):
+                    self.snapshot = snapshot.extended(
+                        manifest, self.out_dir, results_df, pml_df
+                    )
+                else:
+                    self.snapshot = Snapshot.from_frames(results_df, pml_df, manifest)
+
+            return self.snapshot
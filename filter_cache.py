@@ -0,0 +1,69 @@
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+from profiling import count
+
+# total size of the cached row ids and aggregates per process
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def sizeof(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, dict):
+        return sum(sizeof(item) for item in value.values()) + sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sum(sizeof(item) for item in value) + sys.getsizeof(value)
+    return sys.getsizeof(value)
+
+
+class FilterCache:
+    # LRU of results keyed on the normalized filter state, bounded by the
+    # byte size of what it holds rather than by entry count
+    def __init__(self, max_bytes=MAX_CACHE_BYTES, getsizeof=sizeof):
+        self._cache = LRUCache(maxsize=max_bytes, getsizeof=getsizeof)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        with self._lock:
+            try:
+                value = self._cache[key]
+                self.hits += 1
+                count("filter_cache.hit")
+                return value
+            except KeyError:
+                self.misses += 1
+                count("filter_cache.miss")
+
+        value = compute()
+
+        with self._lock:
+            try:
+                self._cache[key] = value
+            except ValueError:
+                # larger than the whole cache, just don't keep it
+                pass
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._cache),
+                "bytes": self._cache.currsize,
+                "max_bytes": self._cache.maxsize,
+            }
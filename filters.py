@@ -0,0 +1,145 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from profiling import span
+
+# rough per-row cost of each predicate kind, cheaper ones run first
+COSTS = {"rows": 0, "equals": 1, "isin": 2, "between": 2, "contains": 10}
+
+
+def _freeze(value):
+    # hashable, order-insensitive form of a filter value for cache keys
+    if isinstance(value, (list, set)):
+        return tuple(sorted(value, key=str))
+    return value
+
+
+class Predicate:
+    def __init__(self, kind, column, value, selectivity=1.0, key=None):
+        self.kind = kind
+        self.column = column
+        self.value = value
+        self.selectivity = selectivity
+        self.key = key if key is not None else _freeze(value)
+
+    def order(self):
+        return (COSTS[self.kind], self.selectivity)
+
+    def mask(self, series):
+        if self.kind == "equals":
+            return series == self.value
+        if self.kind == "isin":
+            return series.isin(self.value)
+        if self.kind == "between":
+            return series.between(*self.value)
+        if self.kind == "contains":
+            return series.str.contains(self.value, na=False, regex=False)
+        raise ValueError(f"unknown predicate kind {self.kind!r}")
+
+
+class FilterPlan:
+    # collects the tab's filters and evaluates them together, narrowing the
+    # surviving row positions predicate by predicate instead of copying the
+    # frame after every filter
+    def __init__(self, df):
+        self.df = df
+        self.predicates = []
+        self._pending = []
+        self._positions = None
+
+    def copy(self):
+        plan = FilterPlan(self.df)
+        plan.predicates = list(self.predicates)
+        plan._pending = list(self._pending)
+        plan._positions = self._positions
+        return plan
+
+    def _estimate(self, column, values):
+        series = self.df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return len(values) / max(len(series.cat.categories), 1)
+        return 1.0
+
+    def _add(self, predicate):
+        self.predicates.append(predicate)
+        self._pending.append(predicate)
+        return self
+
+    def equals(self, column, value):
+        return self._add(
+            Predicate("equals", column, value, self._estimate(column, [value]))
+        )
+
+    def isin(self, column, values):
+        values = list(values)
+        return self._add(
+            Predicate("isin", column, values, self._estimate(column, values))
+        )
+
+    def between(self, column, low, high):
+        return self._add(Predicate("between", column, (low, high)))
+
+    def contains(self, column, text):
+        return self._add(Predicate("contains", column, text))
+
+    def rows(self, labels, name="rows", key=None):
+        # rows already found by an index, e.g. a text search; key identifies
+        # the search (usually its query) in the plan's cache key, without one
+        # the rows themselves are hashed
+        positions = self.df.index.get_indexer(pd.Index(labels).unique())
+        positions = np.sort(positions[positions >= 0])
+        if key is None:
+            key = hashlib.sha1(positions.astype(np.int64).tobytes()).hexdigest()
+        selectivity = len(positions) / max(len(self.df), 1)
+        return self._add(Predicate("rows", name, positions, selectivity, key))
+
+    def key(self):
+        predicates = [
+            (predicate.kind, predicate.column, predicate.key)
+            for predicate in self.predicates
+        ]
+        return tuple(sorted(predicates, key=repr))
+
+    def positions(self):
+        if not self._pending:
+            if self._positions is None:
+                return np.arange(len(self.df))
+            return self._positions
+
+        positions = self._positions
+        for predicate in sorted(self._pending, key=Predicate.order):
+            with span(f"filter.{predicate.kind}.{predicate.column}"):
+                positions = self._narrow(positions, predicate)
+
+        self._positions = positions
+        self._pending = []
+        return positions
+
+    def _narrow(self, positions, predicate):
+        if predicate.kind == "rows":
+            if positions is None:
+                return predicate.value
+            return np.intersect1d(positions, predicate.value, assume_unique=True)
+
+        series = self.df[predicate.column]
+        if positions is not None:
+            series = series.take(positions)
+        mask = predicate.mask(series).fillna(False).to_numpy(dtype=bool)
+        return np.flatnonzero(mask) if positions is None else positions[mask]
+
+    def __len__(self):
+        return len(self.positions())
+
+    def distinct(self, column):
+        values = self.df[column].take(self.positions())
+        return values.sort_values().unique().tolist()
+
+    def execute(self, columns=None, positions=None):
+        # only the projected columns of the surviving rows are materialized
+        if positions is None:
+            positions = self.positions()
+        if columns is None:
+            return self.df.take(positions)
+        return self.df.iloc[positions, self.df.columns.get_indexer(columns)]
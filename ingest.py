@@ -0,0 +1,128 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import pandas as pd
+
+from build_clean import CLEAN_DIR, append_delta, build, read_manifest
+from cleaning import CLEANING_VERSION, clean_results
+from storage import DB_PATH, PARQUET_DIR, RESULTS_COLUMNS, SQLiteStore, open_store
+
+LOG_TABLE = "ingest_log"
+
+
+def read_batch(path):
+    # new contest rows exported as CSV or JSON lines, one row per result
+    if path.endswith((".jsonl", ".ndjson")):
+        return pd.read_json(path, lines=True, dtype=False, convert_dates=False)
+    return pd.read_csv(path, dtype=str)
+
+
+def _append_rows(db_path, batch, source):
+    # raw rows and their log entry are written in one transaction, so a
+    # failed ingest leaves uil.db untouched
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{LOG_TABLE}" ('
+                "version INTEGER PRIMARY KEY, source TEXT, rows INTEGER, "
+                "first_rowid INTEGER, ingested_at REAL)"
+            )
+            (version,) = conn.execute(
+                f'SELECT COALESCE(MAX(version), 0) + 1 FROM "{LOG_TABLE}"'
+            ).fetchone()
+            (last_rowid,) = conn.execute(
+                "SELECT COALESCE(MAX(rowid), 0) FROM results"
+            ).fetchone()
+
+            columns = ", ".join(f'"{col}"' for col in batch.columns)
+            placeholders = ", ".join("?" for _ in batch.columns)
+            rows = batch.astype(object).where(batch.notna(), None)
+            conn.executemany(
+                f"INSERT INTO results ({columns}) VALUES ({placeholders})",
+                rows.itertuples(index=False, name=None),
+            )
+            conn.execute(
+                f'INSERT INTO "{LOG_TABLE}" VALUES (?, ?, ?, ?, ?)',
+                (version, source, len(batch), last_rowid + 1, time.time()),
+            )
+    finally:
+        conn.close()
+
+    return version, last_rowid
+
+
+def ingest(path, db_path=DB_PATH, out_dir=CLEAN_DIR, parquet_dir=PARQUET_DIR):
+    batch = read_batch(path)
+
+    sqlite_store = SQLiteStore(db_path)
+    existing = sqlite_store.columns("results")
+    missing = [
+        col for col in RESULTS_COLUMNS if col in existing and col not in batch.columns
+    ]
+    if missing:
+        raise ValueError(f"{path} is missing columns: {', '.join(missing)}")
+
+    batch = batch[[col for col in batch.columns if col in existing]]
+
+    # the delta can only be stacked on a base built from the current uil.db
+    manifest = read_manifest(out_dir)
+    current = (
+        manifest is not None
+        and manifest.get("cleaning_version") == CLEANING_VERSION
+        and open_store(db_path, parquet_dir).fingerprint(
+            previous=manifest["fingerprint"]
+        )["sha256"]
+        == manifest["fingerprint"]["sha256"]
+    )
+
+    version, last_rowid = _append_rows(db_path, batch, os.path.abspath(path))
+
+    if not current:
+        return build(open_store(db_path, parquet_dir), out_dir)
+
+    # read the batch back so it is cleaned from exactly what a full build
+    # would read out of uil.db
+    results_delta = clean_results(
+        sqlite_store.read("results", RESULTS_COLUMNS, after_rowid=last_rowid)
+    )
+
+    return append_delta(
+        results_delta,
+        version,
+        open_store(db_path, parquet_dir),
+        out_dir,
+        source=os.path.abspath(path),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Append a batch of new contest results to uil.db and the "
+        "cleaned tables without rebuilding them."
+    )
+    parser.add_argument("batch", help="CSV or JSON lines file of results rows")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database to append to")
+    parser.add_argument(
+        "--parquet", default=PARQUET_DIR, help="Parquet export of the database"
+    )
+    parser.add_argument("--out", default=CLEAN_DIR, help="cleaned tables directory")
+    args = parser.parse_args(argv)
+
+    manifest = ingest(args.batch, args.db, args.out, args.parquet)
+    delta = manifest["deltas"][-1] if manifest["deltas"] else None
+    if delta is None:
+        print(f"rebuilt {manifest['rows']['results']} results in {args.out}")
+    else:
+        print(
+            f"ingested {delta['rows']} results as version {delta['version']} "
+            f"({manifest['rows']['results']} total)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
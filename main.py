@@ -1,10 +1,7 @@
 import streamlit as st
-import pickle
 import datetime
-import time
 
-import streamlit_authenticator as stauth
-import yaml
+from auth import Auth, StreamlitLogin
 
 ######################
 
@@ -12,23 +9,16 @@ import yaml
 DIFF_JST_FROM_UTC = 9
 ent_time = datetime.datetime.utcnow() + datetime.timedelta(hours=DIFF_JST_FROM_UTC)
 
-start = time.time() 
-
-# Load configuration
-with open('config.yaml') as file:
-    config = yaml.load(file, Loader=yaml.SafeLoader)
+# Load and check the configuration once per process, not on every rerun
+@st.cache_resource
+def get_auth():
+    return Auth.from_file('config.yaml')
 
 # Create an authenticator instance
-authenticator = stauth.Authenticate(
-    config['credentials'],
-    config['cookie']['name'],
-    config['cookie']['key'],
-    config['cookie']['expiry_days'],
-    config['preauthorized'],
-)
+authenticator = StreamlitLogin(get_auth())
 
 # User login process
-name, authentication_status, username = authenticator.login('main', 'main')
+name, authentication_status, username = authenticator.login('Login', 'main')
 
 
 if 'authentication_status' not in st.session_state:
@@ -0,0 +1,96 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+CHOICE_SLOTS = (1, 2, 3)
+
+
+def build_performance_table(results_df, grades):
+    # one row per result x choice slot, keyed by the PML code of that choice
+
+    slots = []
+    for slot in CHOICE_SLOTS:
+        slots.append(
+            pd.DataFrame(
+                {
+                    "result_id": results_df.index.to_numpy(),
+                    "slot": slot,
+                    "code": results_df[f"code_{slot}"].astype(str).to_numpy(),
+                    "event": results_df["event"].to_numpy(),
+                    "year": results_df["year"].astype(int).to_numpy(),
+                }
+            )
+        )
+    table = pd.concat(slots, ignore_index=True)
+    table = table[table["code"] != ""].reset_index(drop=True)
+    table["grade"] = table["code"].map(grades)
+
+    return table
+
+
+class PerformanceIndex:
+    def __init__(self, results_df, pml_df):
+        self.grades = pml_df.drop_duplicates("code").set_index("code")["grade"]
+        self.table = build_performance_table(results_df, self.grades)
+        self.by_code = self.table.groupby("code").indices
+
+        # a category is every code listed at that grade
+        self.code_grades = pml_df.groupby(pml_df["code"].astype(str))["grade"].unique()
+        empty = np.array([], dtype=np.intp)
+        self.by_grade = {}
+        for grade, codes in pml_df.groupby("grade")["code"]:
+            positions = [self.by_code.get(str(code), empty) for code in codes.unique()]
+            self.by_grade[grade] = np.unique(np.concatenate(positions + [empty]))
+
+        self.pml_by_code = pml_df.groupby(pml_df["code"].astype(str)).indices
+        self._pml_ids = pml_df.index.to_numpy()
+
+    def extended(self, results_delta):
+        # a copy that also covers newly ingested results, the positions of the
+        # new rows come after every existing one so the arrays stay sorted
+        index = copy.copy(self)
+        offset = len(self.table)
+
+        delta = build_performance_table(results_delta, self.grades)
+        index.table = pd.concat([self.table, delta], ignore_index=True)
+
+        index.by_code = dict(self.by_code)
+        added = {}
+        for code, positions in delta.groupby("code").indices.items():
+            positions = positions + offset
+            if code in index.by_code:
+                positions = np.concatenate([index.by_code[code], positions])
+            index.by_code[code] = positions
+
+            for grade in self.code_grades.get(code, []):
+                added.setdefault(grade, []).append(positions[positions >= offset])
+
+        index.by_grade = dict(self.by_grade)
+        for grade, positions in added.items():
+            index.by_grade[grade] = np.concatenate(
+                [self.by_grade.get(grade, np.array([], dtype=np.intp))]
+                + [np.sort(np.concatenate(positions))]
+            )
+
+        return index
+
+    def pml_rows(self, code):
+        return self._pml_ids[self.pml_by_code.get(code, [])]
+
+    def _result_ids(self, positions, event, since):
+        rows = self.table.iloc[positions]
+        rows = rows[rows["event"].str.contains(event) & (rows["year"] >= since)]
+        return np.unique(rows["result_id"].to_numpy())
+
+    def category_ids(self, event, grade, since):
+        positions = self.by_grade.get(grade, [])
+        return self._result_ids(positions, event, since)
+
+    def song_ids(self, code, event, since, category_ids):
+        positions = self.by_code.get(code, [])
+        return np.intersect1d(
+            self._result_ids(positions, event, since),
+            category_ids,
+            assume_unique=True,
+        )
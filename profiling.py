@@ -0,0 +1,137 @@
+import functools
+import json
+import os
+import resource
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# opt in with UIL_PROFILE=1, spans cost one thread-local lookup otherwise
+ENABLED = bool(os.environ.get("UIL_PROFILE"))
+LOG_PATH = os.environ.get("UIL_PROFILE_LOG", "profile.jsonl")
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+def rss_bytes():
+    # current resident set size, falls back to the peak where /proc is missing
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Profiler:
+    # spans and counters of one script rerun or background refresh
+    def __init__(self, kind):
+        self.kind = kind
+        self.id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.spans = []
+        self.counters = {}
+        self.rss_start = rss_bytes()
+        self.rss_end = None
+        self.seconds = None
+        self._start = time.perf_counter()
+        self._depth = 0
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.spans.append(
+                {
+                    "name": name,
+                    "depth": self._depth,
+                    "start_ms": round((start - self._start) * 1000, 3),
+                    "ms": round((time.perf_counter() - start) * 1000, 3),
+                }
+            )
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def finish(self):
+        self.seconds = self.elapsed()
+        self.rss_end = rss_bytes()
+        # spans are recorded when they close, show them in start order
+        self.spans.sort(key=lambda span: span["start_ms"])
+        return self
+
+    def record(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "started_at": self.started_at,
+            "seconds": round(self.seconds, 6),
+            "rss_start": self.rss_start,
+            "rss_end": self.rss_end,
+            "counters": self.counters,
+            "spans": self.spans,
+        }
+
+
+def active():
+    return getattr(_local, "profiler", None)
+
+
+@contextmanager
+def profile(kind, log_path=LOG_PATH, enabled=ENABLED):
+    # everything timed on this thread until the block exits belongs to one
+    # record, which is appended to the JSON lines log
+    if not enabled:
+        yield None
+        return
+
+    profiler = Profiler(kind)
+    previous = active()
+    _local.profiler = profiler
+    try:
+        yield profiler
+    finally:
+        _local.profiler = previous
+        profiler.finish()
+        # background checks that found nothing to do aren't worth a line
+        if log_path and (profiler.spans or profiler.counters):
+            line = json.dumps(profiler.record())
+            with _log_lock, open(log_path, "a") as file:
+                file.write(line + "\n")
+
+
+@contextmanager
+def span(name):
+    profiler = active()
+    if profiler is None:
+        yield
+        return
+
+    with profiler.span(name):
+        yield
+
+
+def count(name, amount=1):
+    profiler = active()
+    if profiler is not None:
+        profiler.count(name, amount)
+
+
+def timed(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
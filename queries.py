@@ -0,0 +1,224 @@
+import re
+
+import pandas as pd
+
+from filters import FilterPlan
+from profiling import timed
+from rollups import SCORES, baseline, build_rollup, score_counts, select, yearly_mean
+from search_index import GRAM_SIZE
+
+# what the results table shows
+RESULTS_TABLE_COLUMNS = [
+    "year",
+    "event",
+    "school",
+    "director",
+    "additional_director",
+    "classification",
+    "choice_1",
+    "choice_2",
+    "choice_3",
+    "concert_final_score",
+    "sight_reading_final_score",
+]
+
+PML_TABLE_COLUMNS = [
+    "grade",
+    "event_name",
+    "title",
+    "composer",
+    "arranger",
+    "code",
+    "performance_count",
+    "average_concert_score",
+    "average_sight_reading_score",
+    "song_score",
+    "specification",
+]
+
+ACCOMPANIMENT = {"A Capella": "(a cappella)", "Accompanied": "(accomp)"}
+
+
+def results_query(text):
+    # school, song and composer searches ignore case and whitespace
+    return re.sub(r"\s+", "", text.lower())
+
+
+def pml_query(text):
+    # remove anything that is not a-z
+    return re.sub(r"[^a-zA-Z]", "", re.sub(r"[^\w\s]", "", text.lower()))
+
+
+def search_with_fallback(index, fuzzy, query):
+    # substring matches, or the closest spellings when nothing contains the
+    # query; returns the rows, whether they are ranked and the fuzzy matches
+    rows = index.search(query)
+    if len(rows) or len(query) < GRAM_SIZE:
+        return rows, False, []
+
+    matches = fuzzy.rank(query)
+    return fuzzy.ranked_rows(matches), True, matches
+
+
+@timed("aggregate.summarize_rollup")
+def summarize_rollup(cube):
+    return {
+        score: {
+            "by_year": yearly_mean(cube, score),
+            "counts": score_counts(cube, score),
+        }
+        for score in SCORES
+    }
+
+
+def results_plan(
+    data,
+    event,
+    sub_events=(),
+    school="",
+    school_level=None,
+    conferences=(),
+    classification=None,
+    years=None,
+    song="",
+    composer="",
+):
+    # the results tab's filters in the order main() applies them
+    indexes = data.search_indexes
+    school, song, composer = map(results_query, (school, song, composer))
+    plan = FilterPlan(data.results_df).equals("gen_event", event)
+
+    if sub_events:
+        plan.isin("event", list(sub_events))
+    if school:
+        plan.rows(indexes["school_search"].search(school), "school_search", school)
+    if school_level:
+        plan.contains("school_level", school_level)
+        if conferences:
+            plan.isin("conference", list(conferences))
+    if classification:
+        plan.equals("classification", classification)
+    if years:
+        plan.between("year", int(years[0]), int(years[1]))
+    if song:
+        rows = search_with_fallback(
+            indexes["song_concat"], indexes["title_fuzzy"], song
+        )[0]
+        plan.rows(rows, "song_concat", song)
+    if composer:
+        rows = search_with_fallback(
+            indexes["composer_concat"], indexes["composer_fuzzy"], composer
+        )[0]
+        plan.rows(rows, "composer_concat", composer)
+
+    return plan
+
+
+def score_summary(
+    data,
+    plan,
+    event,
+    sub_events=(),
+    school_level=None,
+    conferences=(),
+    classification=None,
+    years=None,
+    text_search=False,
+):
+    # yearly means and score counts of the selection and of the whole event;
+    # the rollup answers every filter except the free-text searches
+    if not school_level:
+        # like results_plan, the conferences only narrow a school level
+        conferences = ()
+    if text_search:
+        summarize = lambda: summarize_rollup(
+            build_rollup(plan.execute(["year"] + SCORES), dimensions=["year"])
+        )
+    else:
+        summarize = lambda: summarize_rollup(
+            select(
+                data.rollup,
+                gen_event=event,
+                events=sub_events,
+                school_level=school_level,
+                conferences=conferences,
+                classification=classification,
+                years=years,
+            )
+        )
+
+    # recently used filter states skip the filtering and aggregation
+    selected = data.filter_cache.get(("summary", plan.key()), summarize)
+    overall = data.filter_cache.get(
+        ("baseline", event),
+        lambda: summarize_rollup(baseline(data.rollup, event)),
+    )
+
+    return selected, overall
+
+
+def filter_pml(
+    data,
+    query="",
+    grades=None,
+    event=None,
+    accompaniment="Both",
+    min_performance_count=0,
+):
+    # the PML tab's filters, best fuzzy matches first when the search fell
+    # back to them and by code otherwise
+    pml_df = data.pml_df
+    query = pml_query(query)
+    ranked = False
+
+    if grades:
+        pml_df = pml_df[pml_df["grade"].between(grades[0], grades[1])]
+    if query:
+        indexes = data.search_indexes
+        rows, ranked, _ = search_with_fallback(
+            indexes["total_search"], indexes["pml_fuzzy"], query
+        )
+        pml_df = pml_df.loc[pd.Index(rows).intersection(pml_df.index, sort=False)]
+    if event:
+        pml_df = pml_df[pml_df["event_name"] == event]
+        if "chorus" in event.lower() and accompaniment in ACCOMPANIMENT:
+            pml_df = pml_df[
+                pml_df["specification"].str.contains(
+                    ACCOMPANIMENT[accompaniment], na=False
+                )
+            ]
+    if min_performance_count:
+        pml_df = pml_df[pml_df["performance_count"] >= min_performance_count]
+
+    pml_df = pml_df[PML_TABLE_COLUMNS]
+    if not ranked:
+        pml_df = pml_df.sort_values(by="code")
+
+    return pml_df
+
+
+def song_detail(data, code, event=None):
+    # a title's PML entry, its performances since it was listed and every
+    # performance in its category (event and grade) over the same years
+    performance_index = data.performance_index
+    title_info = data.pml_df.loc[performance_index.pml_rows(code)]
+    if title_info.empty:
+        raise KeyError(code)
+
+    earliest_year = int(title_info["earliest_year"].values[0])
+    grade = int(title_info["grade"].values[0])
+    event = event or title_info["event_name"].values[0]
+
+    category_ids = performance_index.category_ids(event, grade, earliest_year)
+    song_ids = performance_index.song_ids(code, event, earliest_year, category_ids)
+
+    return {
+        "code": code,
+        "title": title_info["title"].values[0],
+        "composer": title_info["composer"].values[0],
+        "event": event,
+        "grade": grade,
+        "earliest_year": earliest_year,
+        "category_ids": category_ids,
+        "song_ids": song_ids,
+    }
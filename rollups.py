@@ -0,0 +1,105 @@
+import pandas as pd
+
+from schema import concat_frames
+
+DIMENSIONS = [
+    "year",
+    "gen_event",
+    "event",
+    "school_level",
+    "conference",
+    "classification",
+]
+SCORES = ["concert_final_score", "sight_reading_final_score"]
+
+
+def build_rollup(results_df, dimensions=DIMENSIONS):
+    # one row per dimension combination with the count, score sums and
+    # a histogram of each final score
+    keys = [results_df[dimension] for dimension in dimensions]
+    cube = (
+        results_df.groupby(keys, observed=True, dropna=False).size().to_frame("count")
+    )
+
+    # scores are stored as int8, sum them in a type that can't overflow
+    sums = (
+        results_df[SCORES]
+        .astype("int64")
+        .groupby(keys, observed=True, dropna=False)
+        .sum()
+    )
+    for score in SCORES:
+        cube[f"{score}_sum"] = sums[score]
+
+        histogram = (
+            results_df.groupby(dimensions + [score], observed=True, dropna=False)
+            .size()
+            .unstack(score, fill_value=0)
+        )
+        histogram.columns = [f"{score}={value}" for value in histogram.columns]
+        cube = cube.join(histogram)
+
+    return cube.fillna(0).reset_index()
+
+
+def merge(cube, delta, dimensions=DIMENSIONS):
+    # fold the rollup of newly ingested rows into an existing one, every
+    # measure is a count or a sum so matching cells just add up
+    combined = concat_frames([cube, delta])
+    measures = [col for col in combined.columns if col not in dimensions]
+    combined[measures] = combined[measures].fillna(0)
+
+    return (
+        combined.groupby(dimensions, observed=True, dropna=False)[measures]
+        .sum()
+        .reset_index()
+    )
+
+
+def select(
+    cube,
+    gen_event=None,
+    events=None,
+    school_level=None,
+    conferences=None,
+    classification=None,
+    years=None,
+):
+    mask = pd.Series(True, index=cube.index)
+
+    if gen_event:
+        mask &= cube["gen_event"] == gen_event
+    if events:
+        mask &= cube["event"].isin(events)
+    if school_level:
+        mask &= cube["school_level"].str.contains(school_level, na=False)
+    if conferences:
+        mask &= cube["conference"].isin(conferences)
+    if classification:
+        mask &= cube["classification"] == classification
+    if years:
+        mask &= cube["year"].between(int(years[0]), int(years[1]))
+
+    return cube[mask]
+
+
+def baseline(cube, gen_event):
+    # the "All Results" lines only depend on the event
+    return cube[cube["gen_event"].str.contains(gen_event)]
+
+
+def yearly_mean(cube, score):
+    totals = cube.groupby("year")[[f"{score}_sum", "count"]].sum()
+    totals = totals[totals["count"] > 0]
+
+    return (totals[f"{score}_sum"] / totals["count"]).rename(score).sort_index()
+
+
+def score_counts(cube, score):
+    prefix = f"{score}="
+    columns = [col for col in cube.columns if col.startswith(prefix)]
+    counts = cube[columns].sum()
+    counts.index = [int(col[len(prefix) :]) for col in columns]
+    counts = counts[counts > 0].astype(int)
+
+    return counts.sort_values(ascending=False).rename("count")
@@ -0,0 +1,81 @@
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from storage import STRING_DTYPE
+
+# low-cardinality labels are stored as categoricals so equality filters
+# compare small integer codes instead of strings
+RESULTS_SCHEMA = {
+    "event": "category",
+    "event_search": "category",
+    "gen_event": "category",
+    "conference": "category",
+    "classification": "category",
+    "school_level": "category",
+    "year": "int16",
+    "concert_score_1": "int8",
+    "concert_score_2": "int8",
+    "concert_score_3": "int8",
+    "concert_final_score": "int8",
+    "sight_reading_score_1": "int8",
+    "sight_reading_score_2": "int8",
+    "sight_reading_score_3": "int8",
+    "sight_reading_final_score": "int8",
+    "choice_1": STRING_DTYPE,
+    "choice_2": STRING_DTYPE,
+    "choice_3": STRING_DTYPE,
+    "song_concat": STRING_DTYPE,
+    "composer_concat": STRING_DTYPE,
+    "school_search": STRING_DTYPE,
+}
+
+PML_SCHEMA = {
+    "event_name": "category",
+    "specification": "category",
+    "grade": "int8",
+    "song_search": STRING_DTYPE,
+    "composer_search": STRING_DTYPE,
+    "total_search": STRING_DTYPE,
+}
+
+
+def apply_schema(df, schema):
+    for col, dtype in schema.items():
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+
+    return df
+
+
+def sort_categories(df):
+    # a file written in chunks holds one dictionary per chunk and reads back
+    # with the categories in order of first appearance, sort them like
+    # astype("category") does so option lists stay alphabetical
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            categories = df[col].cat.categories
+            if not categories.is_monotonic_increasing:
+                df[col] = df[col].cat.reorder_categories(categories.sort_values())
+
+    return df
+
+
+def memory_usage(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def concat_frames(frames):
+    # categoricals only survive a concat when every frame shares the same
+    # categories, so rebuild them over the (sorted) union afterwards
+    frames = [frame for frame in frames if frame is not None]
+    if len(frames) == 1:
+        return frames[0]
+
+    combined = pd.concat(frames, ignore_index=True)
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            combined[col] = union_categoricals(
+                [frame[col] for frame in frames], sort_categories=True
+            )
+
+    return combined
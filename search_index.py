@@ -0,0 +1,199 @@
+import copy
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+GRAM_SIZE = 3
+# candidates kept for the (slower) edit-similarity rerank
+MAX_FUZZY_CANDIDATES = 200
+
+
+def trigrams(text):
+    return {text[i : i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def normalize(values):
+    return values.str.lower().str.replace(r"[^a-z0-9]", "", regex=True)
+
+
+class TrigramIndex:
+    # substring search that only verifies rows sharing every trigram of the query
+    def __init__(self, values):
+        values = pd.Series(values)
+        self.ids = values.index.to_numpy()
+
+        # the same school or program repeats across many rows, index each once
+        self.codes, uniques = pd.factorize(values.fillna("").astype(str))
+        self.terms = np.asarray(uniques, dtype=object)
+        self.postings = {}
+
+        self._layout()
+        self._add_postings(0)
+
+    def _layout(self):
+        # rows of each term, grouped by term id
+        self._order = np.argsort(self.codes, kind="stable")
+        self._bounds = np.concatenate(
+            [[0], np.cumsum(np.bincount(self.codes, minlength=len(self.terms)))]
+        )
+
+    def _add_postings(self, start):
+        added = {}
+        for term_id in range(start, len(self.terms)):
+            for gram in trigrams(self.terms[term_id]):
+                added.setdefault(gram, []).append(term_id)
+
+        # posting arrays of an index being extended are shared, never mutated
+        postings = dict(self.postings)
+        for gram, term_ids in added.items():
+            term_ids = np.array(term_ids, dtype=np.int32)
+            if gram in postings:
+                term_ids = np.concatenate([postings[gram], term_ids])
+            postings[gram] = term_ids
+        self.postings = postings
+
+    def extended(self, values):
+        # a copy that also covers newly ingested rows, only the terms not seen
+        # before are tokenized
+        values = pd.Series(values).fillna("").astype(str)
+        index = copy.copy(self)
+
+        codes = pd.Index(self.terms).get_indexer(values)
+        new = codes < 0
+        new_codes, new_terms = pd.factorize(values[new])
+        codes[new] = new_codes + len(self.terms)
+
+        index.ids = np.concatenate([self.ids, values.index.to_numpy()])
+        index.codes = np.concatenate([self.codes, codes])
+        index.terms = np.concatenate([self.terms, np.asarray(new_terms, dtype=object)])
+        index._layout()
+        index._add_postings(len(self.terms))
+
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _rows(self, term_ids):
+        if len(term_ids) == 0:
+            return self.ids[:0]
+        positions = np.concatenate(
+            [self._order[self._bounds[t] : self._bounds[t + 1]] for t in term_ids]
+        )
+        positions.sort()
+        return self.ids[positions]
+
+    def matching_terms(self, query):
+        # short queries have no trigram to look up, scan the distinct terms
+        if len(query) < GRAM_SIZE:
+            return [t for t, term in enumerate(self.terms) if query in term]
+
+        candidates = None
+        for gram in sorted(
+            trigrams(query), key=lambda g: len(self.postings.get(g, ()))
+        ):
+            term_ids = self.postings.get(gram)
+            if term_ids is None:
+                return []
+            if candidates is None:
+                candidates = term_ids
+            else:
+                candidates = np.intersect1d(candidates, term_ids, assume_unique=True)
+            if len(candidates) == 0:
+                return []
+
+        return [t for t in candidates if query in self.terms[t]]
+
+    def search(self, query):
+        if not query:
+            return self.ids
+        return self._rows(self.matching_terms(query))
+
+
+class FuzzyMatcher(TrigramIndex):
+    # typo-tolerant ranking over the distinct normalized titles or composers,
+    # a title repeated across thousands of results is scored only once
+    def __init__(self, *columns):
+        values, raw = self._normalized(columns)
+        super().__init__(values)
+
+        self.display = self._display(values, raw, 0)
+        self.counts = np.diff(self._bounds)
+
+    @staticmethod
+    def _normalized(columns):
+        raw = pd.concat([col.fillna("").astype(str) for col in columns])
+        values = normalize(raw)
+        keep = values != ""
+        return values[keep], raw[keep]
+
+    def _display(self, values, raw, start):
+        display = raw.str.strip().groupby(values.to_numpy()).first()
+        return display.reindex(self.terms[start:]).to_numpy()
+
+    def extended(self, *columns):
+        values, raw = self._normalized(columns)
+        index = super().extended(values)
+
+        index.display = np.concatenate(
+            [self.display, index._display(values, raw, len(self.terms))]
+        )
+        index.counts = np.diff(index._bounds)
+
+        return index
+
+    def rank(self, query, limit=10, min_score=0.5):
+        query = normalize(pd.Series([query])).iloc[0]
+        grams = trigrams(query)
+        postings = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not postings:
+            return []
+
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.terms))
+        candidates = np.flatnonzero(shared)
+        if len(candidates) > MAX_FUZZY_CANDIDATES:
+            best = np.argsort(-shared[candidates], kind="stable")
+            candidates = candidates[best[:MAX_FUZZY_CANDIDATES]]
+
+        matches = []
+        for term_id in candidates:
+            containment = shared[term_id] / len(grams)
+            similarity = SequenceMatcher(None, query, self.terms[term_id]).ratio()
+            score = (containment + similarity) / 2
+            if score >= min_score:
+                matches.append((term_id, score))
+
+        # ties go to the more frequently performed title
+        matches.sort(key=lambda match: (-match[1], -self.counts[match[0]]))
+
+        return [
+            (self.display[term_id], round(score, 3), term_id)
+            for term_id, score in matches[:limit]
+        ]
+
+    def ranked_rows(self, matches):
+        rows = {}
+        for _, _, term_id in matches:
+            for position in self._order[
+                self._bounds[term_id] : self._bounds[term_id + 1]
+            ]:
+                rows.setdefault(self.ids[position])
+        return list(rows)
+
+
+def build_search_indexes(results_df, pml_df):
+    titles = [results_df[f"title_{i}"] for i in (1, 2, 3)]
+    composers = [results_df[f"composer_{i}"] for i in (1, 2, 3)]
+
+    return {
+        "school_search": TrigramIndex(results_df["school_search"]),
+        "song_concat": TrigramIndex(results_df["song_concat"]),
+        "composer_concat": TrigramIndex(results_df["composer_concat"]),
+        "total_search": TrigramIndex(pml_df["total_search"]),
+        "title_fuzzy": FuzzyMatcher(*titles),
+        "composer_fuzzy": FuzzyMatcher(*composers),
+        "pml_fuzzy": FuzzyMatcher(
+            pml_df["title"], pml_df["composer"], pml_df["arranger"]
+        ),
+    }
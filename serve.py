@@ -0,0 +1,31 @@
+import argparse
+import sys
+
+from streamlit.web import cli
+
+from build_clean import ensure_clean
+from warmup import shared
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build the cleaned tables, start loading them and serve the "
+        "dashboard; other options are passed on to `streamlit run`."
+    )
+    parser.add_argument("--script", default="main.py", help="Streamlit script")
+    args, streamlit_args = parser.parse_known_args(argv)
+
+    # a deploy with a broken uil.db fails here instead of on its first visitor
+    ensure_clean()
+    # the server runs in this process, so its scripts find the load under way
+    shared()
+
+    return cli.main(
+        ["run", args.script, *streamlit_args],
+        prog_name="streamlit",
+        standalone_mode=False,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import fcntl
+import json
+import os
+import shutil
+import time
+
+import pyarrow as pa
+
+from storage import arrow_types
+
+# set to a directory on local disk to share one copy of the frames between
+# all the server processes of a box
+SHARED_DIR = os.environ.get("UIL_SHARED_DIR")
+POINTER_FILE = "current.json"
+LOCK_FILE = "publisher.lock"
+# versions kept on disk, readers may still have the previous one mapped
+KEEP_VERSIONS = 2
+TABLES = ["results", "pml"]
+
+
+def version_name(manifest):
+    return f"{manifest.get('build_id')}-{len(manifest.get('deltas', []))}"
+
+
+def read_pointer(shared_dir):
+    try:
+        with open(os.path.join(shared_dir, POINTER_FILE)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_ipc(df, path):
+    # uncompressed IPC files can be memory-mapped and read without a copy
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _prune(shared_dir, current):
+    versions = [
+        entry
+        for entry in os.scandir(shared_dir)
+        if entry.is_dir() and not entry.name.endswith(".tmp")
+    ]
+    versions.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+
+    # unlinking is safe for processes that still have the files mapped
+    kept = 1
+    for entry in versions:
+        if entry.name == current:
+            continue
+        if kept < KEEP_VERSIONS:
+            kept += 1
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def publish(results_df, pml_df, manifest, shared_dir=SHARED_DIR):
+    name = version_name(manifest)
+    path = os.path.join(shared_dir, name)
+
+    if not os.path.isdir(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        for table, df in zip(TABLES, [results_df, pml_df]):
+            _write_ipc(df, os.path.join(tmp_path, f"{table}.arrow"))
+        os.replace(tmp_path, path)
+
+    # readers switch versions only when the pointer is replaced
+    pointer = {"version": name, "manifest": manifest, "published_at": time.time()}
+    pointer_path = os.path.join(shared_dir, POINTER_FILE)
+    tmp_path = f"{pointer_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(pointer, file)
+    os.replace(tmp_path, pointer_path)
+
+    _prune(shared_dir, name)
+
+    return pointer
+
+
+def map_frame(path):
+    # strings stay in the mapped buffers, numeric columns without nulls are
+    # wrapped rather than copied
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+    return table.to_pandas(types_mapper=arrow_types, split_blocks=True)
+
+
+def map_version(pointer, shared_dir=SHARED_DIR):
+    path = os.path.join(shared_dir, pointer["version"])
+
+    return tuple(map_frame(os.path.join(path, f"{table}.arrow")) for table in TABLES)
+
+
+class PublisherLock:
+    # the process holding this lock cleans and publishes, the others only map;
+    # the lock is released when its process exits so another one takes over
+    def __init__(self, shared_dir=SHARED_DIR):
+        self.path = os.path.join(shared_dir, LOCK_FILE)
+        self._file = None
+
+    def acquire(self):
+        if self._file is not None:
+            return True
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        file = open(self.path, "a")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return False
+
+        self._file = file
+        return True
@@ -0,0 +1,461 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import urllib.parse
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from build_clean import CLEAN_DIR, PML_FILE, RESULTS_FILE, ensure_clean
+from queries import (
+    ACCOMPANIMENT,
+    PML_TABLE_COLUMNS,
+    RESULTS_TABLE_COLUMNS,
+    pml_query,
+    results_query,
+)
+from rollups import SCORES
+from search_index import GRAM_SIZE
+from shared_frames import version_name
+from storage import CHUNK_ROWS, POOL_SIZE, ReadOnlyPool, arrow_types
+
+SQL_FILE = "uil_clean.db"
+# bump whenever the tables or indexes change so the database is rebuilt
+SQL_VERSION = 1
+
+# the cleaned columns the tabs filter on or show, not the whole frames
+RESULTS_SQL_COLUMNS = RESULTS_TABLE_COLUMNS + [
+    "gen_event",
+    "conference",
+    "school_level",
+    "code_1",
+    "code_2",
+    "code_3",
+    "school_search",
+    "song_concat",
+    "composer_concat",
+]
+PML_SQL_COLUMNS = PML_TABLE_COLUMNS + ["earliest_year", "total_search"]
+
+RESULTS_TEXT = ["school_search", "song_concat", "composer_concat"]
+PML_TEXT = ["total_search"]
+
+# the summaries read only the event, year and final scores, which the first
+# two indexes cover without touching the table
+INDEXES = """
+CREATE INDEX results_event_year ON results
+    (gen_event, year, concert_final_score, sight_reading_final_score);
+CREATE INDEX results_sub_event_year ON results
+    (event, year, concert_final_score, sight_reading_final_score);
+CREATE INDEX results_conference ON results (conference);
+CREATE INDEX results_classification ON results (classification);
+CREATE INDEX results_code_1 ON results (code_1);
+CREATE INDEX results_code_2 ON results (code_2);
+CREATE INDEX results_code_3 ON results (code_3);
+CREATE INDEX pml_code ON pml (code);
+CREATE INDEX pml_grade ON pml (grade, code);
+CREATE INDEX pml_event_grade ON pml (event_name, grade);
+"""
+
+# substring search like the in-memory trigram indexes, over the rows of the
+# tables themselves (external content)
+TEXT_INDEXES = {
+    "results_text": ("results", RESULTS_TEXT),
+    "pml_text": ("pml", PML_TEXT),
+}
+
+
+def _deltas(manifest):
+    return [delta["version"] for delta in manifest.get("deltas", [])]
+
+
+def read_meta(path):
+    try:
+        conn = sqlite3.connect(
+            "file:{}?mode=ro".format(urllib.parse.quote(os.path.abspath(path))),
+            uri=True,
+        )
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+    return {key: json.loads(value) for key, value in meta.items()}
+
+
+def _write_meta(conn, manifest, text_search):
+    meta = {
+        "sql_version": SQL_VERSION,
+        "build_id": manifest.get("build_id"),
+        "version": version_name(manifest),
+        "deltas": _deltas(manifest),
+        "text_search": text_search,
+    }
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.executemany(
+        "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+        [(key, json.dumps(value)) for key, value in meta.items()],
+    )
+
+
+def _create_text_indexes(conn):
+    # the trigram tokenizer needs SQLite 3.34+ built with FTS5, without it
+    # the text filters fall back to instr() scans
+    try:
+        for name, (table, columns) in TEXT_INDEXES.items():
+            conn.execute(
+                f"CREATE VIRTUAL TABLE {name} USING fts5"
+                f"({', '.join(columns)}, content='{table}', tokenize='trigram')"
+            )
+            conn.execute(f"INSERT INTO {name} ({name}) VALUES ('rebuild')")
+    except sqlite3.OperationalError:
+        for name in TEXT_INDEXES:
+            conn.execute(f"DROP TABLE IF EXISTS {name}")
+        return False
+
+    return True
+
+
+def _append_deltas(conn, manifest, out_dir, start, text_search):
+    for delta in manifest.get("deltas", [])[start:]:
+        last_rowid = conn.execute("SELECT IFNULL(MAX(rowid), 0) FROM results")
+        last_rowid = last_rowid.fetchone()[0]
+        results_delta = pq.read_table(
+            os.path.join(out_dir, delta["file"]), columns=RESULTS_SQL_COLUMNS
+        ).to_pandas(types_mapper=arrow_types)
+        results_delta.to_sql("results", conn, index=False, if_exists="append")
+
+        if text_search:
+            columns = ", ".join(RESULTS_TEXT)
+            conn.execute(
+                f"INSERT INTO results_text (rowid, {columns}) "
+                f"SELECT rowid, {columns} FROM results WHERE rowid > ?",
+                (last_rowid,),
+            )
+
+
+def export_sql(manifest, out_dir=CLEAN_DIR, batch_rows=CHUNK_ROWS):
+    # copy the cleaned tables into SQLite a batch at a time, index them
+    # once loaded and swap the file in whole
+    path = os.path.join(out_dir, SQL_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        results_file = pq.ParquetFile(os.path.join(out_dir, RESULTS_FILE))
+        for batch in results_file.iter_batches(
+            batch_size=batch_rows, columns=RESULTS_SQL_COLUMNS
+        ):
+            batch.to_pandas(types_mapper=arrow_types).to_sql(
+                "results", conn, index=False, if_exists="append"
+            )
+        pq.read_table(
+            os.path.join(out_dir, PML_FILE), columns=PML_SQL_COLUMNS
+        ).to_pandas(types_mapper=arrow_types).to_sql("pml", conn, index=False)
+
+        conn.executescript(INDEXES)
+        text_search = _create_text_indexes(conn)
+        _append_deltas(conn, manifest, out_dir, 0, text_search)
+        _write_meta(conn, manifest, text_search)
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def ensure_sql(manifest, out_dir=CLEAN_DIR):
+    # ingested batches are appended in place, anything else is a new file
+    path = os.path.join(out_dir, SQL_FILE)
+    meta = read_meta(path)
+
+    if (
+        meta
+        and meta["sql_version"] == SQL_VERSION
+        and meta["build_id"] == manifest.get("build_id")
+    ):
+        deltas = _deltas(manifest)
+        if deltas == meta["deltas"]:
+            return path
+        if deltas[: len(meta["deltas"])] == meta["deltas"]:
+            conn = sqlite3.connect(path)
+            try:
+                _append_deltas(
+                    conn, manifest, out_dir, len(meta["deltas"]), meta["text_search"]
+                )
+                _write_meta(conn, manifest, meta["text_search"])
+                conn.commit()
+            finally:
+                conn.close()
+            return path
+
+    return export_sql(manifest, out_dir)
+
+
+def _marks(values):
+    return ", ".join("?" for _ in values)
+
+
+class SQLSnapshot:
+    # one version of uil_clean.db, queried through pooled read-only
+    # connections instead of frames held in memory
+    def __init__(self, path, manifest, pool_size=POOL_SIZE):
+        self.path = path
+        self.pool = ReadOnlyPool(path, pool_size)
+        self.build_id = manifest.get("build_id")
+        self.deltas = _deltas(manifest)
+        self.name = version_name(manifest)
+        self.text_search = (read_meta(path) or {}).get("text_search", False)
+        self._baselines = {}
+
+    def _frame(self, sql, params=()):
+        with self.pool.connection() as conn:
+            return pd.read_sql_query(sql, conn, params=list(params))
+
+    def _scalar(self, sql, params=()):
+        with self.pool.connection() as conn:
+            return conn.execute(sql, list(params)).fetchone()[0]
+
+    def _text(self, index, column, text):
+        if self.text_search and len(text) >= GRAM_SIZE:
+            phrase = '"{}"'.format(text.replace('"', '""'))
+            return (
+                f"rowid IN (SELECT rowid FROM {index} WHERE {index} MATCH ?)",
+                f"{column}:{phrase}",
+            )
+        return f"instr({column}, ?) > 0", text
+
+    def _where(
+        self,
+        event,
+        sub_events=(),
+        school="",
+        school_level=None,
+        conferences=(),
+        classification=None,
+        years=None,
+        song="",
+        composer="",
+    ):
+        clauses, params = ["gen_event = ?"], [event]
+
+        if sub_events:
+            clauses.append(f"event IN ({_marks(sub_events)})")
+            params += list(sub_events)
+        if school_level:
+            clauses.append("instr(school_level, ?) > 0")
+            params.append(school_level)
+            if conferences:
+                clauses.append(f"conference IN ({_marks(conferences)})")
+                params += list(conferences)
+        if classification:
+            clauses.append("classification = ?")
+            params.append(classification)
+        if years:
+            clauses.append("year BETWEEN ? AND ?")
+            params += [int(years[0]), int(years[1])]
+        for column, text in [
+            ("school_search", school),
+            ("song_concat", song),
+            ("composer_concat", composer),
+        ]:
+            text = results_query(text)
+            if text:
+                clause, param = self._text("results_text", column, text)
+                clauses.append(clause)
+                params.append(param)
+
+        return " AND ".join(clauses), params
+
+    def results(self, offset=0, limit=None, **filters):
+        # the matching row count and one page of the results table
+        where, params = self._where(**filters)
+        n_rows = self._scalar(f"SELECT COUNT(*) FROM results WHERE {where}", params)
+        page = self._frame(
+            f"SELECT {', '.join(RESULTS_TABLE_COLUMNS)} FROM results "
+            f"WHERE {where} ORDER BY rowid LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset],
+        )
+
+        return n_rows, page
+
+    def _summarize(self, where, params):
+        # one pass over the covering index, the cells are few enough to
+        # finish the means and counts in pandas
+        scores = ", ".join(SCORES)
+        cells = self._frame(
+            f"SELECT year, {scores}, COUNT(*) AS count FROM results "
+            f"WHERE {where} GROUP BY year, {scores}",
+            params,
+        )
+        counts_by_year = cells.groupby("year")["count"].sum()
+
+        summary = {}
+        for score in SCORES:
+            totals = (cells[score] * cells["count"]).groupby(cells["year"]).sum()
+            summary[score] = {
+                "by_year": (totals / counts_by_year).rename(score),
+                "counts": cells.groupby(score)["count"]
+                .sum()
+                .sort_values(ascending=False),
+            }
+
+        return summary
+
+    def summary(self, **filters):
+        # the same yearly means and score counts as queries.score_summary,
+        # the whole event's are kept for the life of the snapshot
+        where, params = self._where(**filters)
+        event = filters["event"]
+        if event not in self._baselines:
+            self._baselines[event] = self._summarize("gen_event = ?", [event])
+
+        return self._summarize(where, params), self._baselines[event]
+
+    def pml(
+        self,
+        query="",
+        grades=None,
+        event=None,
+        accompaniment="Both",
+        min_performance_count=0,
+        offset=0,
+        limit=None,
+    ):
+        clauses, params = ["1"], []
+
+        if grades:
+            clauses.append("grade BETWEEN ? AND ?")
+            params += [grades[0], grades[1]]
+        query = pml_query(query)
+        if query:
+            clause, param = self._text("pml_text", "total_search", query)
+            clauses.append(clause)
+            params.append(param)
+        if event:
+            clauses.append("event_name = ?")
+            params.append(event)
+            if "chorus" in event.lower() and accompaniment in ACCOMPANIMENT:
+                clauses.append("instr(specification, ?) > 0")
+                params.append(ACCOMPANIMENT[accompaniment])
+        if min_performance_count:
+            clauses.append("performance_count >= ?")
+            params.append(min_performance_count)
+
+        where = " AND ".join(clauses)
+        n_rows = self._scalar(f"SELECT COUNT(*) FROM pml WHERE {where}", params)
+        page = self._frame(
+            f"SELECT {', '.join(PML_TABLE_COLUMNS)} FROM pml WHERE {where} "
+            "ORDER BY code, rowid LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset],
+        )
+
+        return n_rows, page
+
+    def history(self, code, event=None):
+        # queries.song_detail over the code indexes: the title's yearly
+        # performances and how many performances its category had
+        title_info = self._frame(
+            "SELECT title, composer, event_name, grade, earliest_year FROM pml "
+            "WHERE code = ? ORDER BY rowid LIMIT 1",
+            [code],
+        )
+        if title_info.empty:
+            raise KeyError(code)
+
+        title_info = title_info.iloc[0]
+        event = event or title_info["event_name"]
+        grade = int(title_info["grade"])
+        earliest_year = int(title_info["earliest_year"])
+
+        codes = "(SELECT code FROM pml WHERE grade = ?)"
+        category = (
+            "instr(event, ?) > 0 AND year >= ? AND "
+            f"(code_1 IN {codes} OR code_2 IN {codes} OR code_3 IN {codes})"
+        )
+        category_params = [event, earliest_year, grade, grade, grade]
+
+        by_year = self._frame(
+            "SELECT year, COUNT(*) AS count, "
+            "AVG(concert_final_score) AS concert_final_score FROM results "
+            f"WHERE {category} AND (code_1 = ? OR code_2 = ? OR code_3 = ?) "
+            "GROUP BY year ORDER BY year",
+            category_params + [code, code, code],
+        ).set_index("year")
+
+        return {
+            "code": code,
+            "title": title_info["title"],
+            "composer": title_info["composer"],
+            "event": event,
+            "grade": grade,
+            "earliest_year": earliest_year,
+            "performances": int(by_year["count"].sum()),
+            "category_performances": self._scalar(
+                f"SELECT COUNT(*) FROM results WHERE {category}", category_params
+            ),
+            "by_year": by_year,
+        }
+
+
+class SQLDataset:
+    # dataset.Dataset for the SQL mode: keeps uil_clean.db in step with the
+    # cleaned tables, Warmup refreshes it like the in-memory one
+    def __init__(self, out_dir=CLEAN_DIR, pool_size=POOL_SIZE):
+        self.out_dir = out_dir
+        self.pool_size = pool_size
+        self.snapshot = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        manifest = ensure_clean(out_dir=self.out_dir)
+
+        with self._lock:
+            snapshot = self.snapshot
+            if snapshot is None or snapshot.name != version_name(manifest):
+                path = ensure_sql(manifest, self.out_dir)
+                self.snapshot = SQLSnapshot(path, manifest, self.pool_size)
+                # requests still holding the old snapshot finish on their
+                # connections, the idle ones can go
+                if snapshot is not None:
+                    snapshot.pool.close()
+
+            return self.snapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Copy the cleaned tables into an indexed SQLite database "
+        "for the SQL query mode."
+    )
+    parser.add_argument("--out", default=CLEAN_DIR, help="cleaned tables directory")
+    parser.add_argument(
+        "--force", action="store_true", help="rebuild even if it is up to date"
+    )
+    args = parser.parse_args(argv)
+
+    manifest = ensure_clean(out_dir=args.out)
+    if args.force:
+        path = export_sql(manifest, args.out)
+    else:
+        path = ensure_sql(manifest, args.out)
+
+    meta = read_meta(path)
+    print(
+        f"{path} at {meta['version']}"
+        + ("" if meta["text_search"] else " (no FTS5 trigram support, text scans)")
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
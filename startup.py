@@ -0,0 +1,194 @@
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# the entry points a cold container starts
+SCRIPTS = ["main.py", "UIL_dashboard.py"]
+REPEAT = 3
+# seconds a script may take, the check fails above them
+IMPORT_BUDGET = 1.5
+RENDER_BUDGET = 3.0
+TOP = 12
+
+# run in a fresh interpreter, times AppTest from the script's first line to
+# the end of its first run and then of a warm rerun
+RENDER_SNIPPET = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+
+app = AppTest.from_file(sys.argv[1], default_timeout=float(sys.argv[2]))
+start = time.perf_counter()
+app.run()
+first = time.perf_counter() - start
+start = time.perf_counter()
+app.run()
+rerun = time.perf_counter() - start
+print(json.dumps({"first": first, "rerun": rerun, "errors": len(app.exception)}))
+"""
+
+
+def script_imports(path):
+    # the modules a script imports before it draws anything
+    with open(path) as file:
+        tree = ast.parse(file.read(), path)
+
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+
+    return list(dict.fromkeys(modules))
+
+
+def parse_importtime(stderr):
+    # (depth, self seconds, cumulative seconds, module) per -X importtime line
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, int(own) / 1e6, int(cumulative) / 1e6, name.strip()))
+
+    return entries
+
+
+def import_profile(path, top=TOP):
+    # a cold import of the script's imports: the total, what each direct
+    # import pulled in first and the packages that cost the most themselves
+    modules = script_imports(path)
+    code = "".join(f"import {module}\n" for module in modules)
+    directory = os.path.dirname(os.path.abspath(path))
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=directory,
+        capture_output=True,
+        text=True,
+    )
+    seconds = time.perf_counter() - start
+    if completed.returncode:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    entries = parse_importtime(completed.stderr)
+    direct = {name: cumulative for depth, _, cumulative, name in entries if not depth}
+    packages = {}
+    for _, own, _, name in entries:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + own
+
+    return {
+        "seconds": sum(direct.values()),
+        "process_seconds": seconds,
+        "direct": {name: direct[name] for name in modules if name in direct},
+        "packages": dict(sorted(packages.items(), key=lambda item: -item[1])[:top]),
+    }
+
+
+def render_profile(path, timeout=60):
+    # wall time of a fresh process until the script's first run finished,
+    # interpreter start and imports included, and of one warm rerun
+    directory = os.path.dirname(os.path.abspath(path))
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", RENDER_SNIPPET, os.path.basename(path), str(timeout)],
+        cwd=directory,
+        capture_output=True,
+        text=True,
+    )
+    seconds = time.perf_counter() - start
+    if completed.returncode:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {
+        "first_render": seconds,
+        "script_first_run": timings["first"],
+        "rerun": timings["rerun"],
+        "errors": timings["errors"],
+    }
+
+
+def profile_script(path, repeat=REPEAT):
+    imports = [import_profile(path) for _ in range(repeat)]
+    renders = [render_profile(path) for _ in range(repeat)]
+    median = lambda runs, key: statistics.median(run[key] for run in runs)
+
+    # the breakdown of the median run, the totals are medians of all runs
+    imports.sort(key=lambda run: run["seconds"])
+    return {
+        "script": path,
+        "repeat": repeat,
+        "imports": median(imports, "seconds"),
+        "first_render": median(renders, "first_render"),
+        "rerun": median(renders, "rerun"),
+        "errors": max(run["errors"] for run in renders),
+        "direct": imports[len(imports) // 2]["direct"],
+        "packages": imports[len(imports) // 2]["packages"],
+    }
+
+
+def over_budget(report, import_budget=IMPORT_BUDGET, render_budget=RENDER_BUDGET):
+    failures = []
+    if report["imports"] > import_budget:
+        failures.append(f"imports {report['imports']:.2f}s > {import_budget}s")
+    if report["first_render"] > render_budget:
+        failures.append(
+            f"first render {report['first_render']:.2f}s > {render_budget}s"
+        )
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Break down the cold start of the Streamlit scripts and "
+        "check it against a budget."
+    )
+    parser.add_argument("scripts", nargs="*", default=SCRIPTS)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument(
+        "--import-budget", type=float, default=IMPORT_BUDGET, help="seconds"
+    )
+    parser.add_argument(
+        "--render-budget", type=float, default=RENDER_BUDGET, help="seconds"
+    )
+    parser.add_argument("--out", default="startup.json", help="report file")
+    args = parser.parse_args(argv)
+
+    reports = []
+    failed = False
+    for script in args.scripts:
+        report = profile_script(script, args.repeat)
+        reports.append(report)
+
+        print(
+            f"{script}: imports {report['imports']:.3f}s, first render "
+            f"{report['first_render']:.3f}s, rerun {report['rerun']:.3f}s"
+        )
+        for name, seconds in report["direct"].items():
+            print(f"  import {name:<28} {seconds:.3f}s")
+        for name, seconds in report["packages"].items():
+            print(f"  package {name:<27} {seconds:.3f}s self")
+        if report["errors"]:
+            print(f"  {report['errors']} exceptions on the first render")
+
+        failures = over_budget(report, args.import_budget, args.render_budget)
+        for failure in failures:
+            print(f"  OVER BUDGET: {failure}")
+        failed = failed or bool(failures)
+
+    with open(args.out, "w") as file:
+        json.dump({"reports": reports}, file, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
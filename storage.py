@@ -0,0 +1,342 @@
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import urllib.parse
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DB_PATH = "uil.db"
+PARQUET_DIR = "raw"
+EXPORT_MANIFEST = "source.json"
+TABLES = ["results", "pml"]
+# rows per chunk when a table is streamed instead of read whole
+CHUNK_ROWS = 50000
+# read-only connections kept open per pool
+POOL_SIZE = 4
+
+# the only columns the dashboard reads, everything else stays on disk
+RESULTS_COLUMNS = [
+    "contest_date",
+    "event",
+    "gen_event",
+    "school",
+    "director",
+    "additional_director",
+    "conference",
+    "classification",
+    "title_1",
+    "title_2",
+    "title_3",
+    "composer_1",
+    "composer_2",
+    "composer_3",
+    "code_1",
+    "code_2",
+    "code_3",
+    "concert_score_1",
+    "concert_score_2",
+    "concert_score_3",
+    "concert_final_score",
+    "sight_reading_score_1",
+    "sight_reading_score_2",
+    "sight_reading_score_3",
+    "sight_reading_final_score",
+]
+
+PML_COLUMNS = [
+    "event_name",
+    "code",
+    "grade",
+    "title",
+    "composer",
+    "arranger",
+    "specification",
+    "performance_count",
+    "average_concert_score",
+    "average_sight_reading_score",
+    "song_score",
+    "earliest_year",
+]
+
+STRING_DTYPE = pd.StringDtype("pyarrow")
+
+
+def arrow_types(arrow_type):
+    # keep text columns arrow-backed instead of materializing python objects
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return STRING_DTYPE
+    return None
+
+
+def _digest_file(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# path -> (stat key, sha256) of the last hash, so a file whose stat values
+# haven't moved since isn't read again, e.g. by every warmup poll that
+# checks a stale Parquet export against uil.db
+_file_hashes = {}
+
+
+def _hash_file(path):
+    stat = os.stat(path)
+    stat_key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    cached = _file_hashes.get(path)
+    if cached is not None and cached[0] == stat_key:
+        return cached[1]
+
+    sha256 = _digest_file(path)
+    _file_hashes[path] = (stat_key, sha256)
+    return sha256
+
+
+def source_fingerprint(paths, previous=None):
+    if isinstance(paths, str):
+        paths = [paths]
+
+    stats = [os.stat(path) for path in paths]
+    fingerprint = {
+        "size": sum(stat.st_size for stat in stats),
+        "mtime_ns": max(stat.st_mtime_ns for stat in stats),
+    }
+
+    # size and mtime unchanged, skip re-hashing the source files
+    if (
+        previous
+        and previous.get("size") == fingerprint["size"]
+        and previous.get("mtime_ns") == fingerprint["mtime_ns"]
+    ):
+        return previous
+
+    if len(paths) == 1:
+        fingerprint["sha256"] = _hash_file(paths[0])
+    else:
+        digest = hashlib.sha256()
+        for path in paths:
+            digest.update(_hash_file(path).encode())
+        fingerprint["sha256"] = digest.hexdigest()
+
+    return fingerprint
+
+
+def _projection(available, columns):
+    if columns is None:
+        return list(available)
+    return [col for col in columns if col in available]
+
+
+def _as_text(df):
+    # sqlite columns can mix types, text is what the cleaning expects
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].astype(STRING_DTYPE)
+
+    return df
+
+
+class SQLiteStore:
+    kind = "sqlite"
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.paths = [db_path]
+
+    def columns(self, table):
+        conn = sqlite3.connect(self.db_path)
+        info = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+        conn.close()
+        return [row[1] for row in info]
+
+    def read(self, table, columns=None, after_rowid=None):
+        columns = _projection(self.columns(table), columns)
+        select = ", ".join(f'"{col}"' for col in columns)
+
+        query = f'SELECT {select} FROM "{table}"'
+        params = ()
+        # only the rows appended after a known rowid, e.g. an ingested batch
+        if after_rowid is not None:
+            query += " WHERE rowid > ?"
+            params = (after_rowid,)
+
+        conn = sqlite3.connect(self.db_path)
+        df = pd.read_sql_query(query, conn, params=params)
+        conn.close()
+
+        return _as_text(df)
+
+    def read_chunks(self, table, columns=None, chunk_rows=CHUNK_ROWS):
+        # the table chunk_rows rows at a time, in rowid order
+        columns = _projection(self.columns(table), columns)
+        select = ", ".join(f'"{col}"' for col in columns)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for df in pd.read_sql_query(
+                f'SELECT {select} FROM "{table}" ORDER BY rowid',
+                conn,
+                chunksize=chunk_rows,
+            ):
+                yield _as_text(df)
+        finally:
+            conn.close()
+
+    def fingerprint(self, previous=None):
+        return source_fingerprint(self.paths, previous)
+
+
+class ParquetStore:
+    kind = "parquet"
+
+    def __init__(self, directory=PARQUET_DIR):
+        self.directory = directory
+        self.paths = [self.path(table) for table in TABLES]
+
+    def path(self, table):
+        return os.path.join(self.directory, f"{table}.parquet")
+
+    def columns(self, table):
+        return pq.read_schema(self.path(table)).names
+
+    def read(self, table, columns=None):
+        columns = _projection(self.columns(table), columns)
+        arrow_table = pq.read_table(self.path(table), columns=columns)
+
+        return arrow_table.to_pandas(types_mapper=arrow_types)
+
+    def read_chunks(self, table, columns=None, chunk_rows=CHUNK_ROWS):
+        columns = _projection(self.columns(table), columns)
+        parquet_file = pq.ParquetFile(self.path(table))
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas(types_mapper=arrow_types)
+
+    def fingerprint(self, previous=None):
+        return source_fingerprint(self.paths, previous)
+
+    def exported_from(self):
+        try:
+            with open(os.path.join(self.directory, EXPORT_MANIFEST)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+
+class ReadOnlyPool:
+    # connections opened read-only once and handed out to one thread at a time
+    def __init__(self, db_path=DB_PATH, size=POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._uri = "file:{}?mode=ro".format(
+            urllib.parse.quote(os.path.abspath(db_path))
+        )
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(None)
+
+    def _connect(self):
+        return sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        # blocks while every connection is in use, a slot holds None until
+        # its connection is first needed
+        conn = self._idle.get(timeout=timeout)
+        try:
+            if conn is None:
+                conn = self._connect()
+            yield conn
+        except sqlite3.Error:
+            # don't hand a broken connection to the next caller
+            if conn is not None:
+                conn.close()
+            conn = None
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def query(self, sql, params=()):
+        with self.connection() as conn:
+            cursor = conn.execute(sql, params)
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor]
+
+    def close(self):
+        # idle connections only, ones in use are closed when they come back
+        # and fail, or reused after the pool reopens them
+        slots = []
+        while True:
+            try:
+                slots.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for conn in slots:
+            if conn is not None:
+                conn.close()
+            self._idle.put(None)
+
+
+def export_parquet(db_path=DB_PATH, out_dir=PARQUET_DIR):
+    sqlite_store = SQLiteStore(db_path)
+    fingerprint = sqlite_store.fingerprint()
+    os.makedirs(out_dir, exist_ok=True)
+
+    rows = {}
+    for table in TABLES:
+        df = sqlite_store.read(table)
+        path = os.path.join(out_dir, f"{table}.parquet")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        rows[table] = len(df)
+
+    with open(os.path.join(out_dir, EXPORT_MANIFEST), "w") as file:
+        json.dump(
+            {"source": os.path.abspath(db_path), "fingerprint": fingerprint}, file
+        )
+
+    return rows
+
+
+def open_store(db_path=DB_PATH, parquet_dir=PARQUET_DIR):
+    parquet_store = ParquetStore(parquet_dir)
+
+    if not all(os.path.exists(path) for path in parquet_store.paths):
+        return SQLiteStore(db_path)
+
+    if not os.path.exists(db_path):
+        return parquet_store
+
+    # a Parquet export older than uil.db is ignored until it is re-exported
+    exported = parquet_store.exported_from()
+    if exported and exported["fingerprint"]["sha256"] == (
+        source_fingerprint(db_path, exported["fingerprint"])["sha256"]
+    ):
+        return parquet_store
+
+    return SQLiteStore(db_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export the uil.db tables to Parquet for the columnar store."
+    )
+    parser.add_argument("--db", default=DB_PATH, help="source SQLite database")
+    parser.add_argument("--out", default=PARQUET_DIR, help="output directory")
+    args = parser.parse_args(argv)
+
+    rows = export_parquet(args.db, args.out)
+    print(", ".join(f"{count} {table} rows" for table, count in rows.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import logging
+
+import api
+from benchmark import generate_db
+from build_clean import ensure_clean
+from dataset import Dataset
+
+
+def test_summary_ignores_the_conference_without_a_school_level(tmp_path, monkeypatch):
+    logging.getLogger("cleaning").setLevel(logging.ERROR)
+    monkeypatch.chdir(tmp_path)
+    generate_db("uil.db", scale=0.005)
+    ensure_clean()
+
+    event = {"event": ["Chorus"]}
+    conference = {"event": ["Chorus"], "conference": ["6A"]}
+    narrowed = {**conference, "school_level": ["High School"]}
+    for order in [[event, conference], [conference, event]]:
+        # a fresh snapshot, so the first request fills the cache
+        data = Dataset().refresh()
+        first, second = (api.summary(data, params) for params in order)
+        assert first == second
+        assert api.summary(Dataset().refresh(), conference) == first
+
+        # with a school level the conference does narrow the selection
+        assert api.summary(data, narrowed)["selected"] != first["selected"]
+        assert api.summary(data, narrowed) == api.summary(Dataset().refresh(), narrowed)
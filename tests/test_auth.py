@@ -0,0 +1,82 @@
+import pytest
+
+from auth import Auth, SessionSigner
+
+CONFIG = {
+    "cookie": {"name": "test", "key": "secret", "expiry_days": 1},
+    "credentials": {
+        "usernames": {
+            "director": {"name": "Director", "password": "plaintext"},
+        }
+    },
+}
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "dXNlcg.1.n.é",
+        "dXNlcg.9999999999.n.é",
+        "é.9999999999.n.sig",
+        "//8.9999999999.n.sig",
+        "dXNlcg.soon.n.sig",
+        "not a token",
+        "",
+        None,
+    ],
+)
+def test_malformed_tokens_are_rejected(token):
+    signer = SessionSigner("secret", 3600)
+    assert signer.verify(token) is None
+
+
+def test_session_round_trip_and_tampering():
+    auth = Auth(CONFIG, rounds=4)
+    token = auth.login("Director", "plaintext")
+    assert auth.session(token)["username"] == "director"
+    assert auth.session(token[:-1] + "é") is None
+    assert auth.login("director", "wrong") is None
+    assert auth.login("nobody", "plaintext") is None
+
+    auth.logout(token)
+    assert auth.session(token) is None
+
+
+def test_every_check_costs_one_bcrypt_run(monkeypatch):
+    import bcrypt
+
+    auth = Auth(CONFIG, rounds=4)
+    calls = []
+    for name in ["hashpw", "checkpw"]:
+        original = getattr(bcrypt, name)
+        monkeypatch.setattr(
+            bcrypt,
+            name,
+            lambda *args, _original=original, _name=name: calls.append(_name)
+            or _original(*args),
+        )
+
+    attempts = [
+        ("nobody", "plaintext", False),
+        ("director", "wrong", False),
+        ("director", "plaintext", True),
+        ("nobody", "wrong", False),
+    ]
+    for username, password, expected in attempts:
+        calls.clear()
+        user = auth.credentials.verify(username, password)
+        assert (user is not None) is expected
+        assert len(calls) == 1, (username, password, calls)
+
+
+def test_concurrent_first_logins():
+    from concurrent.futures import ThreadPoolExecutor
+
+    auth = Auth(CONFIG, rounds=4)
+    with ThreadPoolExecutor(8) as pool:
+        tokens = list(
+            pool.map(lambda i: auth.login("director", "plaintext"), range(32))
+        )
+
+    assert all(tokens)
+    assert auth.credentials.users["director"]["hash"] is not None
@@ -0,0 +1,82 @@
+import random
+
+from bk_tree import BKTree, Pattern, confusable_pairs, levenshtein
+from word_bank import word_key
+
+
+def table_levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        previous = current
+    return previous[-1]
+
+
+def random_word(rng, alphabet, low, high):
+    return "".join(rng.choices(alphabet, k=rng.randint(low, high)))
+
+
+def test_pattern_distance_matches_the_table():
+    rng = random.Random(0)
+    # short words over a small alphabet, long ones past one machine word
+    for alphabet, low, high, runs in [("abc", 0, 12, 3000), ("abcdefgh", 50, 150, 200)]:
+        for _ in range(runs):
+            a = random_word(rng, alphabet, low, high)
+            b = random_word(rng, alphabet, low, high)
+            expected = table_levenshtein(a, b)
+            assert Pattern(a).distance(b) == expected, (a, b)
+            assert Pattern(b).distance(a) == expected, (a, b)
+            assert levenshtein(a, b, limit=2) == min(expected, 3)
+
+
+def test_pattern_distance_of_long_near_copies():
+    base = "x" * 100 + "abc" + "y" * 40
+    assert Pattern(base).distance(base) == 0
+    assert Pattern(base).distance(base.replace("abc", "abd")) == 1
+    assert Pattern(base).distance(base[:70] + base[71:]) == 1
+    assert Pattern("").distance(base) == len(base)
+
+
+def test_search_and_pairs_match_brute_force():
+    rng = random.Random(1)
+    words = sorted({random_word(rng, "abcde", 3, 8) for _ in range(400)})
+    tree = BKTree(words)
+
+    for _ in range(100):
+        query = random_word(rng, "abcde", 2, 9)
+        for max_distance in [0, 1, 2]:
+            expected = sorted(
+                (distance, word)
+                for word in words
+                if (distance := table_levenshtein(word_key(query), word_key(word)))
+                <= max_distance
+            )
+            assert tree.search(query, max_distance) == expected, query
+
+    expected = sorted(
+        (distance, a, b)
+        for i, a in enumerate(words)
+        for b in words[i + 1 :]
+        if 0 < (distance := table_levenshtein(a, b)) <= 2
+    )
+    assert confusable_pairs(words, 2) == expected
+
+
+def test_duplicates_are_stored_once():
+    tree = BKTree(["pinky", "Pinky", "pinky", "zebra", "", "Pinky"])
+    assert len(tree) == 3
+    assert tree.search("pinky", 0) == [(0, "Pinky"), (0, "pinky")]
+
+
+def test_default_distance_finds_the_requested_pairs():
+    # both examples of the request are two letters apart
+    pairs = confusable_pairs(["pinkie", "pinky", "freebie", "freedbee"])
+    assert pairs == [(2, "freebie", "freedbee"), (2, "pinkie", "pinky")]
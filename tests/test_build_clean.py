@@ -0,0 +1,50 @@
+import logging
+
+import pandas as pd
+import pytest
+
+from benchmark import generate_db
+from build_clean import build, load_clean
+from storage import SQLiteStore
+
+
+@pytest.fixture(scope="module")
+def builds(tmp_path_factory):
+    # the synthetic dates include missing ones on purpose
+    logging.getLogger("cleaning").setLevel(logging.ERROR)
+    root = tmp_path_factory.mktemp("build")
+    db_path = str(root / "uil.db")
+    generate_db(db_path, scale=0.005)
+    store = SQLiteStore(db_path)
+
+    frames = {}
+    for name, chunk_rows in [("full", None), ("chunked", 3)]:
+        out_dir = str(root / name)
+        build(store, out_dir, chunk_rows=chunk_rows)
+        frames[name] = load_clean(out_dir)
+
+    return frames
+
+
+def test_chunked_build_matches_full_build(builds):
+    (full_results, full_pml), (chunked_results, chunked_pml) = (
+        builds["full"],
+        builds["chunked"],
+    )
+    pd.testing.assert_frame_equal(full_results, chunked_results)
+    pd.testing.assert_frame_equal(full_pml, chunked_pml)
+
+
+def test_chunked_build_keeps_categories_sorted(builds):
+    full_results, chunked_results = builds["full"][0], builds["chunked"][0]
+    categorical = [
+        col
+        for col in full_results.columns
+        if isinstance(full_results[col].dtype, pd.CategoricalDtype)
+    ]
+
+    assert categorical
+    for col in categorical:
+        categories = chunked_results[col].cat.categories
+        assert list(categories) == list(full_results[col].cat.categories), col
+        assert categories.is_monotonic_increasing, col
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from filter_cache import FilterCache
+from filters import FilterPlan
+
+DF = pd.DataFrame(
+    {
+        "event": pd.Categorical(["band", "band", "chorus", "orchestra"]),
+        "year": [2020, 2021, 2022, 2023],
+    },
+    index=[10, 11, 12, 13],
+)
+
+
+def test_rows_without_key_give_a_hashable_plan_key():
+    plan = FilterPlan(DF).equals("event", "band").rows([11, 10, 99], "school")
+    same = FilterPlan(DF).rows([10, 11], "school").equals("event", "band")
+    other = FilterPlan(DF).equals("event", "band").rows([10], "school")
+
+    assert hash(plan.key()) == hash(same.key())
+    assert plan.key() == same.key()
+    assert plan.key() != other.key()
+
+    cache = FilterCache()
+    assert list(cache.get(plan.key(), plan.positions)) == [0, 1]
+    assert list(cache.get(same.key(), lambda: None)) == [0, 1]
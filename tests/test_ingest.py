@@ -0,0 +1,77 @@
+import logging
+import shutil
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import ingest
+from benchmark import generate_db
+from build_clean import ensure_clean
+from dataset import Dataset
+from rollups import SCORES, score_counts, select, yearly_mean
+
+
+def test_ingested_batches_match_a_full_rebuild(tmp_path, monkeypatch):
+    # the synthetic dates include missing ones on purpose
+    logging.getLogger("cleaning").setLevel(logging.ERROR)
+    monkeypatch.chdir(tmp_path)
+    generate_db("full.db", scale=0.02)
+    shutil.copy("full.db", "uil.db")
+
+    # the last rows of the database arrive later as two batches
+    with sqlite3.connect("full.db") as connection:
+        results = pd.read_sql_query('SELECT * FROM "results"', connection)
+    base_rows = len(results) - 120
+    with sqlite3.connect("uil.db") as connection:
+        connection.execute('DELETE FROM "results" WHERE rowid > ?', (base_rows,))
+    results.iloc[base_rows : base_rows + 60].to_csv("b1.csv", index=False)
+    results.iloc[base_rows + 60 :].to_json("b2.jsonl", orient="records", lines=True)
+
+    ensure_clean()
+    dataset = Dataset()
+    dataset.refresh()
+    ingest.main(["b1.csv"])
+    dataset.refresh()
+    ingest.main(["b2.jsonl"])
+    incremental = dataset.refresh()
+    assert incremental.deltas == [1, 2]
+
+    ensure_clean(force=True)
+    full = Dataset().refresh()
+    assert full.deltas == []
+
+    pd.testing.assert_frame_equal(
+        incremental.results_df.reset_index(drop=True),
+        full.results_df.reset_index(drop=True),
+    )
+    pd.testing.assert_frame_equal(incremental.pml_df, full.pml_df)
+
+    for name in ["school_search", "song_concat", "composer_concat"]:
+        for query in ["school1", "song", "comp", "a", "ch12"]:
+            assert list(incremental.search_indexes[name].search(query)) == list(
+                full.search_indexes[name].search(query)
+            ), (name, query)
+
+    for score in SCORES:
+        pd.testing.assert_series_equal(
+            yearly_mean(incremental.rollup, score), yearly_mean(full.rollup, score)
+        )
+        pd.testing.assert_series_equal(
+            score_counts(incremental.rollup, score).sort_index(),
+            score_counts(full.rollup, score).sort_index(),
+        )
+        pd.testing.assert_series_equal(
+            yearly_mean(select(incremental.rollup, "Band"), score),
+            yearly_mean(select(full.rollup, "Band"), score),
+        )
+
+    ours, theirs = incremental.performance_index, full.performance_index
+    for code in list(theirs.by_code)[:50]:
+        for event in ["Band", "Chorus"]:
+            ids = theirs.category_ids(event, 3, 2010)
+            assert np.array_equal(ours.category_ids(event, 3, 2010), ids)
+            assert np.array_equal(
+                ours.song_ids(code, event, 2010, ids),
+                theirs.song_ids(code, event, 2010, ids),
+            )
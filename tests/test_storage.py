@@ -0,0 +1,34 @@
+import os
+import sqlite3
+
+import storage
+from benchmark import generate_db
+from storage import ParquetStore, SQLiteStore, export_parquet, open_store
+
+
+def test_stale_export_is_not_rehashed_on_every_open(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "uil.db")
+    parquet_dir = str(tmp_path / "raw")
+    generate_db(db_path, scale=0.005)
+    export_parquet(db_path, parquet_dir)
+    assert isinstance(open_store(db_path, parquet_dir), ParquetStore)
+
+    # uil.db moves on after the export, e.g. an ingest
+    with sqlite3.connect(db_path) as connection:
+        connection.execute('DELETE FROM "results" WHERE rowid = 1')
+    os.utime(db_path, ns=(1, 1))
+
+    hashed = []
+    digest_file = storage._digest_file
+    monkeypatch.setattr(
+        storage, "_digest_file", lambda path: hashed.append(path) or digest_file(path)
+    )
+    for _ in range(3):
+        assert isinstance(open_store(db_path, parquet_dir), SQLiteStore)
+    assert hashed == [db_path]
+
+    # a real change is still noticed
+    with sqlite3.connect(db_path) as connection:
+        connection.execute('DELETE FROM "results" WHERE rowid = 2')
+    assert isinstance(open_store(db_path, parquet_dir), SQLiteStore)
+    assert hashed == [db_path, db_path]
@@ -0,0 +1,62 @@
+from word_bank import WordBank
+from word_store import WordLists, read_list
+
+WORDS = [
+    "Ballyhoo",
+    "ballyhoo",
+    "food  chain",
+    "foodchain",
+    "happy – go – lucky",
+    "Kleenex",
+    "pinkie",
+    "pinky",
+    "zebra",
+    "# a comment",
+    "",
+]
+
+
+def make_lists(tmp_path):
+    (tmp_path / "lists" / "2024").mkdir(parents=True)
+    (tmp_path / "lists" / "2024" / "spelling.txt").write_text("\n".join(WORDS))
+    return WordLists(str(tmp_path / "lists"), str(tmp_path / "cache"))
+
+
+def test_read_list_normalizes_and_dedupes(tmp_path):
+    lists = make_lists(tmp_path)
+    words = [word for _, word in read_list(lists.source("2024/spelling"))]
+
+    assert words == [
+        "ballyhoo",
+        "food chain",
+        "foodchain",
+        "happy-go-lucky",
+        "Kleenex",
+        "pinkie",
+        "pinky",
+        "zebra",
+    ]
+
+
+def test_table_answers_like_a_word_bank(tmp_path):
+    lists = make_lists(tmp_path)
+    table = lists.view(["2024/spelling"])
+    bank = WordBank(table.decode(), ["2024/spelling"] * len(table))
+
+    assert len(table) == len(bank)
+    assert table.letters() == bank.letters()
+    for prefix in ["", "b", "FOOD C", "happygo", "pink", "q", "zebras"]:
+        assert table.count(prefix) == bank.count(prefix), prefix
+        for page in [1, 2, 5]:
+            assert table.page(prefix, page, 2) == bank.page(prefix, page, 2)
+    assert table.tags_of("Happy-Go-Lucky") == ("2024/spelling",)
+    assert table.tags_of("happy") == ()
+
+
+def test_stale_cache_is_rebuilt(tmp_path):
+    lists = make_lists(tmp_path)
+    assert lists.table("2024/spelling").count("z") == 1
+
+    source = tmp_path / "lists" / "2024" / "spelling.txt"
+    source.write_text(source.read_text() + "\nzest\nzesty\n")
+    assert lists.table("2024/spelling").count("z") == 3
@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+
+from dataset import Dataset
+from profiling import profile
+
+# how often the background thread checks uil.db and the cleaned tables
+REFRESH_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    # loads the dataset on a background thread and keeps it current, script
+    # runs only ever read the last finished snapshot
+    def __init__(self, dataset=None, interval=REFRESH_SECONDS):
+        self.dataset = dataset or Dataset()
+        self.interval = interval
+        self.state = "starting"
+        self.error = None
+        self.started_at = None
+        self.ready_at = None
+        self.refreshed_at = None
+        self.last_profile = None
+        self._ready = threading.Event()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self.started_at = time.time()
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="uil-warmup", daemon=True
+                )
+                self._thread.start()
+
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def refresh_now(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.state = "loading" if self.dataset.snapshot is None else "refreshing"
+            try:
+                with profile("refresh") as profiler:
+                    self.dataset.refresh()
+                if profiler is not None and profiler.spans:
+                    self.last_profile = profiler.record()
+            except Exception as exc:
+                # keep serving the previous snapshot if there is one
+                logger.exception("loading the dashboard data failed")
+                self.error = exc
+                self.state = "ready" if self.dataset.snapshot is not None else "failed"
+            else:
+                self.error = None
+                self.refreshed_at = time.time()
+                if self.dataset.snapshot is None:
+                    # another process is still publishing the shared frames
+                    self.state = "loading"
+                else:
+                    self.state = "ready"
+                    if not self._ready.is_set():
+                        self.ready_at = self.refreshed_at
+                        self._ready.set()
+
+            # poll quickly while waiting on another process to publish
+            waiting = self.state == "loading"
+            self._wake.wait(1 if waiting else self.interval)
+            self._wake.clear()
+
+    @property
+    def snapshot(self):
+        return self.dataset.snapshot
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def status(self):
+        now = time.time()
+        return {
+            "state": self.state,
+            "ready": self.dataset.snapshot is not None,
+            "error": None if self.error is None else str(self.error),
+            "elapsed": None if self.started_at is None else now - self.started_at,
+            "ready_seconds": (
+                None if self.ready_at is None else self.ready_at - self.started_at
+            ),
+            "refreshed_at": self.refreshed_at,
+        }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared():
+    # the process's one warmup, serve.py starts it before the server takes
+    # its first session and every script run afterwards reuses it
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Warmup()
+        return _shared.start()
@@ -0,0 +1,106 @@
+import bisect
+import itertools
+import re
+
+PAGE_SIZE = 100
+
+
+def word_key(word):
+    # case, spaces and hyphens don't matter, "Food chain" files as foodchain
+    return re.sub(r"[^a-z]", "", word.lower())
+
+
+def page_slice(start, end, page, page_size=PAGE_SIZE):
+    # the positions of one page of the matches start:end and the page count
+    pages = max(1, -(-(end - start) // page_size))
+    page = min(max(page, 1), pages)
+    first = start + (page - 1) * page_size
+
+    return first, min(first + page_size, end), pages
+
+
+class _Node:
+    __slots__ = ["children", "start", "end"]
+
+    def __init__(self, start):
+        self.children = {}
+        self.start = start
+        self.end = start
+
+
+class WordBank:
+    # the words sorted once by key; every trie node knows the slice of that
+    # order its prefix covers, so a lookup walks len(prefix) nodes and the
+    # matching words, counts and pages are slices; tags, one per word, name
+    # the lists a word came from
+    def __init__(self, words, tags=None):
+        unique = {}
+        tagged = {}
+        tags = itertools.repeat(None) if tags is None else tags
+        for word, tag in zip(words, tags):
+            word = " ".join(str(word).split())
+            key = word_key(word)
+            if not key:
+                continue
+            entry = (key, word.lower())
+            unique.setdefault(entry, word)
+            if tag is not None:
+                tagged.setdefault(entry, set()).add(tag)
+
+        entries = sorted(unique)
+        self.keys = [key for key, _ in entries]
+        self.words = [unique[entry] for entry in entries]
+        self.tags = [tuple(sorted(tagged.get(entry, ()))) for entry in entries]
+        self.root = _Node(0)
+
+        for position, key in enumerate(self.keys):
+            node = self.root
+            node.end = position + 1
+            for char in key:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node(position)
+                child.end = position + 1
+                node = child
+
+    def __len__(self):
+        return len(self.words)
+
+    def _bounds(self, prefix):
+        node = self.root
+        for char in word_key(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return 0, 0
+        return node.start, node.end
+
+    def count(self, prefix=""):
+        start, end = self._bounds(prefix)
+        return end - start
+
+    def starting_with(self, prefix=""):
+        start, end = self._bounds(prefix)
+        return self.words[start:end]
+
+    def page(self, prefix="", page=1, page_size=PAGE_SIZE):
+        # one page of the matches and the number of pages
+        first, last, pages = page_slice(*self._bounds(prefix), page, page_size)
+        return self.words[first:last], pages
+
+    def letters(self):
+        # first letter -> number of words, a-z order
+        return {
+            char: node.end - node.start
+            for char, node in sorted(self.root.children.items())
+        }
+
+    def _find(self, word):
+        key = word_key(word)
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return position
+        return None
+
+    def tags_of(self, word):
+        position = self._find(word)
+        return () if position is None else self.tags[position]
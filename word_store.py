@@ -0,0 +1,295 @@
+import argparse
+import bisect
+import mmap
+import os
+import string
+import struct
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+
+from word_bank import PAGE_SIZE, WordBank, page_slice, word_key
+
+# one directory per contest year, one text file per list:
+# word_lists/2024/spelling.txt is the list "2024/spelling"
+LIST_DIR = "word_lists"
+# next to the cleaned tables, see build_clean.CLEAN_DIR
+CACHE_DIR = os.path.join("clean", "words")
+CACHE_SUFFIX = ".words"
+
+MAGIC = b"UILWORDS"
+CACHE_VERSION = 1
+# magic, version, words, source size and mtime
+HEADER = struct.Struct("=8sIIqq")
+
+# typographic dashes and quotes pasted in from documents
+_PUNCTUATION = str.maketrans({"‐": "-", "‑": "-", "–": "-", "—": "-", "’": "'"})
+
+
+def normalize(line):
+    # one spelling as the lists should hold it, "" for nothing
+    line = line.split("#", 1)[0]
+    line = unicodedata.normalize("NFKC", line).translate(_PUNCTUATION)
+    return " ".join(line.replace(" - ", "-").split())
+
+
+def iter_words(path):
+    # streams a list file, one word per line
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            word = normalize(line)
+            if word and word_key(word):
+                yield word
+
+
+def read_list(path):
+    # the list's distinct words sorted by key; the same word in another case
+    # is a duplicate and the lower case spelling wins
+    unique = {}
+    for word in iter_words(path):
+        entry = (word_key(word), word.lower())
+        seen = unique.get(entry)
+        if seen is None or (seen != entry[1] and word == entry[1]):
+            unique[entry] = word
+
+    return [(key, unique[key, lower]) for key, lower in sorted(unique)]
+
+
+def _blob(strings):
+    # the utf-8 strings back to back and the offsets of their boundaries
+    encoded = [string.encode() for string in strings]
+    offsets = array("I", [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    return offsets, b"".join(encoded)
+
+
+def write_table(source, path):
+    # sorted string table: header, key offsets, keys, word offsets, words;
+    # the offsets are read in place from the mapped file
+    stat = os.stat(source)
+    entries = read_list(source)
+    key_offsets, keys = _blob(key for key, _ in entries)
+    word_offsets, words = _blob(word for _, word in entries)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(
+            HEADER.pack(
+                MAGIC, CACHE_VERSION, len(entries), stat.st_size, stat.st_mtime_ns
+            )
+        )
+        file.write(key_offsets.tobytes())
+        file.write(keys)
+        file.write(word_offsets.tobytes())
+        file.write(words)
+    os.replace(tmp_path, path)
+
+    return len(entries)
+
+
+def read_header(path):
+    try:
+        with open(path, "rb") as file:
+            magic, version, count, size, mtime_ns = HEADER.unpack(
+                file.read(HEADER.size)
+            )
+    except (OSError, struct.error):
+        return None
+    if magic != MAGIC or version != CACHE_VERSION:
+        return None
+
+    return {"words": count, "size": size, "mtime_ns": mtime_ns}
+
+
+def _stamp(source):
+    stat = os.stat(source)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def is_fresh(source, path):
+    header = read_header(path)
+    return header is not None and (header["size"], header["mtime_ns"]) == _stamp(source)
+
+
+class WordTable:
+    # a memory-mapped cache file, words are decoded only when asked for
+    def __init__(self, path, name=None):
+        self.path = path
+        self.name = name
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(self._mmap)
+        _, _, count, size, mtime_ns = HEADER.unpack_from(view)
+        # the source file this table was built from
+        self.stamp = (size, mtime_ns)
+        width = array("I").itemsize
+        start = HEADER.size
+        self._key_offsets = view[start : start + (count + 1) * width].cast("I")
+        start += (count + 1) * width
+        self._keys = view[start : start + self._key_offsets[count]]
+        start += self._key_offsets[count]
+        self._word_offsets = view[start : start + (count + 1) * width].cast("I")
+        start += (count + 1) * width
+        self._words = view[start : start + self._word_offsets[count]]
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def key(self, position):
+        offsets = self._key_offsets
+        return bytes(self._keys[offsets[position] : offsets[position + 1]]).decode()
+
+    def word(self, position):
+        offsets = self._word_offsets
+        return bytes(self._words[offsets[position] : offsets[position + 1]]).decode()
+
+    def decode(self, start=0, end=None):
+        end = self._count if end is None else end
+        return [self.word(position) for position in range(start, end)]
+
+    def prefix_range(self, prefix):
+        # binary search over the keys in the file, nothing else is decoded
+        prefix = word_key(prefix)
+        start = bisect.bisect_left(range(self._count), prefix, key=self.key)
+        end = bisect.bisect_left(
+            range(start, self._count),
+            True,
+            key=lambda position: not self.key(position).startswith(prefix),
+        )
+        return start, start + end
+
+    # the WordBank calls the word page makes, answered from the mapped file
+
+    def count(self, prefix=""):
+        start, end = self.prefix_range(prefix)
+        return end - start
+
+    def page(self, prefix="", page=1, page_size=PAGE_SIZE):
+        first, last, pages = page_slice(*self.prefix_range(prefix), page, page_size)
+        return self.decode(first, last), pages
+
+    def letters(self):
+        counts = {char: self.count(char) for char in string.ascii_lowercase}
+        return {char: count for char, count in counts.items() if count}
+
+    def tags_of(self, word):
+        key = word_key(word)
+        position = bisect.bisect_left(range(self._count), key, key=self.key)
+        found = position < self._count and self.key(position) == key
+        return (self.name,) if found else ()
+
+    def close(self):
+        for name in ["_key_offsets", "_keys", "_word_offsets", "_words"]:
+            getattr(self, name).release()
+        self._mmap.close()
+
+
+class WordLists:
+    # the lists on disk, each mapped from its cache the first time it's used
+    # and the cache rebuilt when the text file changed
+    def __init__(self, root=LIST_DIR, cache_dir=CACHE_DIR):
+        self.root = root
+        self.cache_dir = cache_dir
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        names = []
+        if not os.path.isdir(self.root):
+            return names
+        for year in sorted(os.listdir(self.root)):
+            year_dir = os.path.join(self.root, year)
+            if not os.path.isdir(year_dir):
+                continue
+            for file_name in sorted(os.listdir(year_dir)):
+                if file_name.endswith(".txt"):
+                    names.append(f"{year}/{file_name[:-4]}")
+        return names
+
+    def years(self):
+        return sorted({name.split("/")[0] for name in self.names()})
+
+    def source(self, name):
+        return os.path.join(self.root, *name.split("/")) + ".txt"
+
+    def stamp(self, name):
+        # changes whenever the list's text file does
+        return _stamp(self.source(name))
+
+    def cache_path(self, name):
+        return os.path.join(self.cache_dir, name.replace("/", "-") + CACHE_SUFFIX)
+
+    def table(self, name):
+        source = self.source(name)
+        if not os.path.exists(source):
+            raise KeyError(name)
+
+        with self._lock:
+            table = self._tables.get(name)
+            if table is not None and table.stamp == _stamp(source):
+                return table
+
+            path = self.cache_path(name)
+            if not is_fresh(source, path):
+                write_table(source, path)
+            self._tables[name] = WordTable(path, name)
+            # a replaced table may still be read by a rerun, it's left to
+            # the garbage collector rather than closed here
+
+        return self._tables[name]
+
+    def view(self, names):
+        # what the word page pages through: one list straight from its
+        # mapped table, several merged into a WordBank
+        if len(names) == 1:
+            return self.table(names[0])
+        return self.bank(names)
+
+    def bank(self, names=None):
+        # a prefix index over the union of the lists, each word tagged with
+        # every list it appears on
+        names = self.names() if names is None else list(names)
+        words, tags = [], []
+        for name in names:
+            table_words = self.table(name).decode()
+            words.extend(table_words)
+            tags.extend([name] * len(table_words))
+        return WordBank(words, tags)
+
+
+WORD_LISTS = WordLists()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Rebuild the binary caches of the word lists."
+    )
+    parser.add_argument("--root", default=LIST_DIR)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--force", action="store_true", help="rebuild fresh caches")
+    args = parser.parse_args(argv)
+
+    lists = WordLists(args.root, args.cache_dir)
+    for name in lists.names():
+        source, path = lists.source(name), lists.cache_path(name)
+        if args.force or not is_fresh(source, path):
+            start = time.perf_counter()
+            words = write_table(source, path)
+            seconds = time.perf_counter() - start
+            print(
+                f"{name}: {words} words, {os.path.getsize(path)} bytes, {seconds:.3f}s"
+            )
+        else:
+            print(f"{name}: fresh")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())